@@ -0,0 +1,177 @@
+import os
+import time
+import threading
+from datetime import datetime
+
+from blockdev import device_size, logical_block_size
+from patterns import make_pattern
+from wipe_engine import (aligned_buffer, open_target, round_down, pipelined_write,
+                         striped_write, split_stripes, STRIPE_ALIGN, DEFAULT_CHUNK)
+
+# Short probe at the start of a wipe on the first few hundred MB: sweep the
+# block size ladder at the default queue depth, then the queue depths at the
+# fastest block size, and keep the fastest combination.
+BLOCK_LADDER = [64 * 1024, 256 * 1024, 1024**2, 4 * 1024**2, 16 * 1024**2]
+PROBE_BUDGET = 512 * 1024**2  # bytes written (and read back) across all trials
+MIN_TRIAL_ROUNDS = 2          # a trial must move at least block * depth * this to be measured
+
+
+class TuneResult:
+    def __init__(self):
+        self.write_block = None
+        self.write_depth = 1
+        self.read_block = None
+        self.read_depth = 1
+        self.io_backend = "threads"
+        self.trials = []
+        self.skipped = []
+
+    def best(self, op):
+        rows = [t for t in self.trials if t["op"] == op]
+        return max(rows, key=lambda t: t["mib_s"]) if rows else None
+
+    def as_dict(self):
+        return {
+            "write_block_size": self.write_block,
+            "write_queue_depth": self.write_depth,
+            "read_block_size": self.read_block,
+            "read_queue_depth": self.read_depth,
+            "io_backend": self.io_backend,
+            "trials": self.trials,
+            "skipped": self.skipped,
+        }
+
+
+def plan_trials(candidates, limit, budget=PROBE_BUDGET, keep=None):
+    """Share budget over (block size, depth) pairs so each moves at least
+    block * depth * MIN_TRIAL_ROUNDS: a pair needing more than an even share
+    gets its need, the others split what is left. While the needs do not fit
+    the largest pair other than keep is dropped, so the trials together never
+    write more than budget. Returns ([(bs, depth, bytes)], skipped)."""
+    need = lambda c: c[0] * c[1] * MIN_TRIAL_ROUNDS
+    pairs = sorted(set(candidates), key=need, reverse=True)
+    skipped = []
+    while sum(need(c) for c in pairs) > budget:
+        drop = next((c for c in pairs if c != keep), None)
+        if drop is None:
+            break
+        pairs.remove(drop)
+        skipped.append(drop)
+    share, left = {}, budget
+    for i, c in enumerate(pairs):
+        share[c] = round_down(min(max(need(c), left // (len(pairs) - i)), left, limit), c[0])
+        left -= share[c]
+    return [(bs, d, share[(bs, d)]) for bs, d in candidates if share.get((bs, d), 0) > 0], skipped
+
+
+def _write_trial(fd, n, pattern, block_size, depth, io_backend):
+    if io_backend == "aio":
+        from linux_aio import aio_write
+        aio_write(fd, 0, n, pattern, block_size, depth)
+    elif depth > 1:
+        striped_write(fd, 0, n, pattern, block_size, depth)
+    else:
+        pipelined_write(fd, 0, n, pattern, block_size)
+    os.fsync(fd)
+
+
+def _read_trial(fd, n, block_size, depth, io_backend):
+    if io_backend == "aio":
+        from linux_aio import aio_read
+        aio_read(fd, 0, n, block_size, lambda view, off: None, depth)
+        return
+
+    def read_range(start, end):
+        view = memoryview(aligned_buffer(block_size))
+        pos = start
+        while pos < end:
+            got = os.preadv(fd, [view[:min(block_size, end - pos)]], pos)
+            if got <= 0:
+                break
+            pos += got
+
+    stripes = split_stripes(0, n, depth, max(block_size, STRIPE_ALIGN))
+    workers = [threading.Thread(target=read_range, args=(s.start, s.end)) for s in stripes]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+
+
+def autotune(device, pattern="zero", depths=(1,), ladder=BLOCK_LADDER,
+             io_backend="threads", verify=True, logf=None, cancel_flag=None, default=None):
+    """Probe write (and read, if verify) throughput over the start of the device:
+    every block size of ladder at the default depth, then every depth at the
+    fastest block size. default (block size, depth) is the engine's current
+    setting and is always measured (DEFAULT_CHUNK at depths[0] when None).
+    Destructive: the probed region is overwritten, so run it only as part of
+    a wipe. Returns TuneResult."""
+    result = TuneResult()
+    result.io_backend = io_backend
+    if io_backend == "aio":
+        from linux_aio import aio_available
+        if not aio_available():
+            result.io_backend = io_backend = "threads"
+    pattern = make_pattern(pattern)
+    bs0, d0 = default or (DEFAULT_CHUNK, depths[0])
+    cancelled = lambda: cancel_flag is not None and cancel_flag.is_set()
+    fd, direct = open_target(device)
+    plan = []
+    try:
+        size = device_size(device, fd)
+        lbs = logical_block_size(device, fd)
+        blocks = sorted({bs for bs in list(ladder) + [bs0] if bs % lbs == 0})
+        more_depths = [d for d in dict.fromkeys(depths) if d != d0]
+        # hold back what the depth sweep needs at the default block size
+        reserve = min(PROBE_BUDGET // 2, sum(bs0 * d * MIN_TRIAL_ROUNDS for d in more_depths))
+        first, skipped = plan_trials([(bs, d0) for bs in blocks], size,
+                                     PROBE_BUDGET - reserve, keep=(bs0, d0))
+        if logf:
+            logf.write(f"[{datetime.now().isoformat()}] Autotune on {device}: {len(first)} block "
+                       f"sizes at queue depth {d0}, then {len(more_depths)} more depth(s), "
+                       f"{PROBE_BUDGET} byte budget, O_DIRECT={'on' if direct else 'off'}\n")
+        for stage in (first, None):
+            if stage is None:
+                best = result.best("write")
+                if best is None or not more_depths:
+                    break
+                stage, dropped = plan_trials([(best["block_size"], d) for d in more_depths], size,
+                                             PROBE_BUDGET - sum(n for _, _, n in plan))
+                skipped += dropped
+            for bs, d, n in stage:
+                if cancelled():
+                    break
+                t = time.monotonic()
+                _write_trial(fd, n, pattern, bs, d, io_backend)
+                dt = time.monotonic() - t
+                plan.append((bs, d, n))
+                result.trials.append({"op": "write", "block_size": bs, "queue_depth": d,
+                                      "bytes": n, "mib_s": round(n / dt / 1024**2, 1)})
+        result.skipped = [{"block_size": bs, "queue_depth": d} for bs, d in skipped]
+        if skipped and logf:
+            logf.write(f"Autotune skipped {len(skipped)} pair(s) too large for the budget: "
+                       f"{skipped}\n")
+    finally:
+        os.close(fd)
+
+    if verify and not cancelled():
+        fd, direct = open_target(device, write=False)
+        try:
+            for bs, d, n in plan:
+                t = time.monotonic()
+                _read_trial(fd, n, bs, d, io_backend)
+                dt = time.monotonic() - t
+                result.trials.append({"op": "read", "block_size": bs, "queue_depth": d,
+                                      "bytes": n, "mib_s": round(n / dt / 1024**2, 1)})
+        finally:
+            os.close(fd)
+
+    for op in ("write", "read"):
+        best = result.best(op)
+        if best:
+            setattr(result, f"{op}_block", best["block_size"])
+            setattr(result, f"{op}_depth", best["queue_depth"])
+            if logf:
+                logf.write(f"Autotune {op}: block {best['block_size']}, queue depth "
+                           f"{best['queue_depth']} at {best['mib_s']} MiB/s\n")
+    return result
@@ -0,0 +1,104 @@
+import os
+import fcntl
+import struct
+import stat
+
+# ioctl numbers from <linux/fs.h>
+BLKSSZGET = 0x1268
+BLKPBSZGET = 0x127b
+BLKGETSIZE64 = 0x80081272
+BLKFLSBUF = 0x1261
+BLKDISCARD = 0x1277
+BLKSECDISCARD = 0x127d
+BLKZEROOUT = 0x127f
+
+RANGE_IOCTLS = {"zeroout": BLKZEROOUT, "secdiscard": BLKSECDISCARD, "discard": BLKDISCARD}
+
+
+def sysfs_queue_attr(device, attr):
+    """Read /sys/class/block/<dev>/queue/<attr>, or None if unavailable"""
+    base = os.path.basename(os.path.realpath(device))
+    try:
+        with open(f"/sys/class/block/{base}/queue/{attr}") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def is_block_device(path):
+    try:
+        return stat.S_ISBLK(os.stat(path).st_mode)
+    except OSError:
+        return False
+
+
+def device_size(device, fd=None):
+    """Size in bytes of a block device or regular file (image targets)"""
+    own = fd is None
+    if own:
+        fd = os.open(device, os.O_RDONLY)
+    try:
+        if stat.S_ISBLK(os.fstat(fd).st_mode):
+            try:
+                buf = fcntl.ioctl(fd, BLKGETSIZE64, b"\0" * 8)
+                return struct.unpack("Q", buf)[0]
+            except OSError:
+                pass
+        return os.lseek(fd, 0, os.SEEK_END)
+    finally:
+        if own:
+            os.close(fd)
+
+
+def _block_size(device, fd, req, attr, default):
+    if fd is not None:
+        try:
+            if stat.S_ISBLK(os.fstat(fd).st_mode):
+                buf = fcntl.ioctl(fd, req, b"\0" * 4)
+                return struct.unpack("I", buf)[0]
+        except OSError:
+            pass
+    val = sysfs_queue_attr(device, attr)
+    if val and val.isdigit():
+        return int(val)
+    return default
+
+
+def logical_block_size(device, fd=None):
+    return _block_size(device, fd, BLKSSZGET, "logical_block_size", 512)
+
+
+def physical_block_size(device, fd=None):
+    return _block_size(device, fd, BLKPBSZGET, "physical_block_size", 4096)
+
+
+def offload_caps(device):
+    """What the kernel advertises for clearing ranges without data transfer"""
+    caps = {}
+    for attr in ("write_zeroes_max_bytes", "discard_granularity", "discard_max_bytes"):
+        val = sysfs_queue_attr(device, attr)
+        caps[attr] = int(val) if val and val.isdigit() else 0
+    return caps
+
+
+def range_ioctl(fd, tier, start, length):
+    """Issue BLKZEROOUT / BLKSECDISCARD / BLKDISCARD on [start, start+length).
+    Raises OSError (EOPNOTSUPP, EINVAL, ...) when the kernel rejects it."""
+    fcntl.ioctl(fd, RANGE_IOCTLS[tier], struct.pack("QQ", start, length))
+
+
+def drop_cached_pages(device, fd):
+    """Flush and drop the page cache held for device so the next reads come
+    from the media. Returns the method used ('blkflsbuf' or 'fadvise')."""
+    try:
+        if stat.S_ISBLK(os.fstat(fd).st_mode):
+            fcntl.ioctl(fd, BLKFLSBUF, 0)
+            return "blkflsbuf"
+    except OSError:
+        pass
+    try:
+        os.fdatasync(fd)
+    except OSError:
+        pass
+    os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    return "fadvise"
@@ -1,5 +1,11 @@
+import os
 import subprocess
-import time
+import sys
+
+# Shared helpers live one directory up, next to driver.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from hotplug import HotplugService, wait_for_fastboot
+from inventory import Inventory
 
 def run_cmd(cmd, capture_output=True):
     try:
@@ -29,17 +35,6 @@ def bootloader_unlocked():
         return prop == "0"
     return False
 
-def wait_for_fastboot(timeout=30):
-    print("Waiting for device to appear in fastboot mode...")
-    for i in range(timeout):
-        output = run_cmd("fastboot devices")
-        if output and output.strip() != "":
-            print(f"Fastboot device detected: {output.strip()}")
-            return True
-        time.sleep(1)
-    print("Timeout waiting for fastboot device.")
-    return False
-
 def main():
     devices = adb_devices()
     if not devices:
@@ -63,15 +58,24 @@ def main():
     if bootloader_unlocked():
         print("Bootloader is unlocked. Using Fastboot to wipe device.")
         print("Rebooting to bootloader...")
+        try:
+            service = HotplugService(Inventory()).start()
+        except OSError:
+            service = None
+        mark = service.mark() if service else None
         run_cmd("adb reboot bootloader")
 
-        if wait_for_fastboot():
+        print("Waiting for device to appear in fastboot mode...")
+        found = wait_for_fastboot(lambda: run_cmd("fastboot devices"), 30, service, mark)
+        if found:
+            print(f"Fastboot device detected: {found}")
             print("Erasing userdata and cache...")
             run_cmd("fastboot erase userdata")
             run_cmd("fastboot erase cache")
             run_cmd("fastboot reboot")
             print("Wipe complete. Device rebooting.")
         else:
+            print("Timeout waiting for fastboot device.")
             print("[!] Could not detect fastboot device. Abort.")
         return
 
@@ -1,28 +1,19 @@
 #!/usr/bin/env python3
 import os
 import subprocess
+import sys
 import time
 
+# Shared helpers live one directory up, next to driver.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from inventory import Inventory
+
 def get_usb_devices():
-    """Find USB devices using multiple methods"""
-    usb_devices = []
-    
-    try:
-        # Use lsblk to find removable devices
-        result = subprocess.run(['lsblk', '-d', '-o', 'NAME,RO,RM,SIZE,TYPE'], 
-                              capture_output=True, text=True, check=True)
-        
-        for line in result.stdout.splitlines()[1:]:  # Skip header
-            parts = line.split()
-            if len(parts) >= 5 and parts[4] == 'disk' and parts[2] == '1':  # RM=1 means removable
-                device_name = '/dev/' + parts[0]
-                # Only add the device, not partitions
-                if not any(char.isdigit() for char in parts[0]):
-                    usb_devices.append(device_name)
-                        
-    except Exception as e:
-        print(f"Error finding USB devices: {e}")
-        
+    """Find removable whole disks (sysfs inventory, no partitions)"""
+    inventory = Inventory()
+    usb_devices = [d.path for d in inventory.devices() if d.type == 'disk' and d.removable]
+    if inventory.error:
+        print(f"Error finding USB devices: {inventory.error}")
     return usb_devices
 
 def unmount_device(device):
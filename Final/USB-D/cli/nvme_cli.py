@@ -1,29 +1,26 @@
+import os
 import subprocess
 import sys
 import time
 
-def list_nvme_devices():
-    try:
-        result = subprocess.run(
-            ["lsblk", "-dpno", "NAME,TRAN,SIZE,TYPE,MOUNTPOINT"],
-            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True
-        )
+# Shared helpers live one directory up, next to driver.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from inventory import Inventory, human_size
 
-        devices = [line for line in result.stdout.splitlines() if "nvme" in line]
-
-        if not devices:
-            print("No NVMe devices found.")
-            sys.exit(1)
+def list_nvme_devices():
+    inventory = Inventory()
+    devices = [f"{d.path} {d.transport} {human_size(d.size)} {d.type} {' '.join(d.mountpoints)}".strip()
+               for d in inventory.devices() if d.transport == "nvme"]
 
-        print("\nDetected NVMe Devices:")
-        for idx, device in enumerate(devices, 1):
-            print(f"{idx}. {device}")
+    if not devices:
+        print(f"No NVMe devices found.{f' ({inventory.error})' if inventory.error else ''}")
+        sys.exit(1)
 
-        return devices
+    print("\nDetected NVMe Devices:")
+    for idx, device in enumerate(devices, 1):
+        print(f"{idx}. {device}")
 
-    except subprocess.CalledProcessError as e:
-        print(f"Error occurred while listing devices: {e.stderr}")
-        sys.exit(1)
+    return devices
 
 def select_device(devices):
     while True:
@@ -38,19 +35,10 @@ def select_device(devices):
 
 def verify_device(device):
     print(f"\nVerifying {device}...")
-    try:
-        result = subprocess.run(
-            ["lsblk", "-dpno", "NAME,TRAN,MOUNTPOINT", device],
-            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True
-        )
-
-        if result.stdout.strip():
-            print(f"Device {device} is accessible and ready for operation.")
-        else:
-            print(f"Warning: Device {device} might not be correctly recognized.")
-            sys.exit(1)
-    except subprocess.CalledProcessError as e:
-        print(f"Error verifying device: {e.stderr}")
+    if Inventory().get(device) is not None:
+        print(f"Device {device} is accessible and ready for operation.")
+    else:
+        print(f"Warning: Device {device} might not be correctly recognized.")
         sys.exit(1)
 
 def sanitize_device(device):
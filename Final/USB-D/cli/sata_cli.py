@@ -2,6 +2,11 @@ import subprocess
 import sys
 import os
 
+# Shared wipe helpers live one directory up, next to driver.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from wipe_engine import multipass_overwrite
+from inventory import Inventory
+
 def run_cmd(cmd):
     try:
         result = subprocess.run(cmd, shell=True, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
@@ -12,17 +17,7 @@ def run_cmd(cmd):
         return None
 
 def list_sata_devices():
-    output = run_cmd("lsblk -d -o NAME,TYPE,TRAN")
-    sata_devices = []
-    if output:
-        lines = output.splitlines()
-        for line in lines[1:]:  # Skip header line
-            parts = line.split()
-            if len(parts) == 3:
-                name, type_, tran = parts
-                if type_ == "disk" and tran == "sata":
-                    sata_devices.append(f"/dev/{name}")
-    return sata_devices
+    return [d.path for d in Inventory().devices() if d.type == "disk" and d.transport == "sata"]
 
 def check_device_exists(dev):
     if os.path.exists(dev):
@@ -69,33 +64,24 @@ def secure_erase(dev, password="password"):
     print("Secure Erase command issued successfully.")
     return True
 
+def print_progress(done, total, elapsed, stage=None):
+    rate = done / elapsed / (1024**2) if elapsed > 0 else 0
+    pct = 100 * done // total if total else 100
+    end = "\n" if done >= total else ""
+    print(f"\r    {stage}: {done//(1024**2)}/{total//(1024**2)} MiB ({pct}%) {rate:.1f} MiB/s", end=end, flush=True)
+
 def random_overwrite(dev, passes=3, block_size=1024*1024):
     print(f"[*] Performing {passes}-pass random overwrite (slow)...")
-    size_output = run_cmd(f"blockdev --getsize64 {dev}")
-    if size_output is None:
-        print("Could not get device size.")
-        return False
-    size = int(size_output)
-    print(f"Device size: {size} bytes")
-    try:
-        with open(dev, "wb") as f:
-            for pass_num in range(passes):
-                print(f"    Pass {pass_num+1} of {passes}...")
-                bytes_written = 0
-                while bytes_written < size:
-                    data = os.urandom(min(block_size, size - bytes_written))
-                    f.write(data)
-                    bytes_written += len(data)
-                f.flush()
-                os.fsync(f.fileno())
+    schedule = ["random"] * passes
+    success, status = multipass_overwrite(dev, schedule, block_size=block_size, logf=sys.stdout,
+                                          progress=print_progress)
+    if success:
         print("Random overwrite complete.")
-        return True
-    except PermissionError:
-        print("Permission denied. Run script as root!")
-        return False
-    except Exception as e:
-        print(f"Error during overwrite: {e}")
-        return False
+    elif status == "cancelled_by_user":
+        print("Overwrite cancelled.")
+    else:
+        print("Error during overwrite (are you root?).")
+    return success
 
 def main():
     if len(sys.argv) == 1:
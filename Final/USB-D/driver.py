@@ -1,4 +1,21 @@
 from certgen import save_certificates
+from wipe_engine import (direct_overwrite, offload_zero, multipass_overwrite, rewrite_ranges,
+                         open_target, round_down, Cancelled, DEFAULT_CHUNK, STRIPE_ALIGN,
+                         AIO_QUEUE_DEPTH, CHECKPOINT_EVERY, WRITEBACK_WINDOW)
+from autotune import autotune
+from journal import WipeJournal, journal_path
+from linux_aio import aio_available, aio_read
+from patterns import restore_pattern, ZeroPattern
+from merkle import RegionHasher, refresh_regions, MERKLE_REGION
+from verify import (block_checker, record_mismatch, scan_zero, scan_ranges, parallel_scan_zero,
+                    mmap_scan_zero, sampled_scan_zero, SamplePlan, DirtyMap, InlineVerifier)
+from inventory import Inventory
+from smart import SmartCache
+from hotplug import (HotplugService, partition_added, touches_device, block_name,
+                     wait_for_fastboot)
+from blockdev import (is_block_device, sysfs_queue_attr, device_size, logical_block_size,
+                      physical_block_size, drop_cached_pages)
+import io
 import os
 import subprocess
 import threading
@@ -11,6 +28,7 @@ from datetime import datetime
 import tkinter as tk
 from tkinter import ttk, messagebox
 import platform, getpass, socket
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as TaskTimeout
 
 # - Utilities -
 def is_root():
@@ -52,19 +70,45 @@ def collect_system_metadata():
         "operator": getpass.getuser()
     }
 
+def inventory_identity(device):
+    """Device metadata from the inventory already in memory (no smartctl/udevadm)"""
+    meta = {"device": device, "identity_source": "inventory"}
+    dev = INVENTORY.get(device)
+    if dev is not None:
+        for key in ("model", "serial", "wwn"):
+            if getattr(dev, key):
+                meta[key] = getattr(dev, key)
+        if dev.size:
+            meta["capacity_bytes"] = str(dev.size)
+            meta["capacity_human"] = f"{dev.size//(1024**3)} GB"
+        meta["interface"] = dev.interface or dev.interface_hint() or "unknown"
+    return meta
+
 def collect_device_metadata(device):
     meta = {"device": device}
     try:
-        if check_dependency("smartctl"):
-            info = run_cmd(f"smartctl -i {device}")
-            if info:
-                for line in info.splitlines():
-                    if "Model Number" in line: meta["model"] = line.split(":")[-1].strip()
-                    if "Serial Number" in line: meta["serial"] = line.split(":")[-1].strip()
-                    if "Firmware Version" in line: meta["firmware"] = line.split(":")[-1].strip()
+        info = smart_identity(device)
+        if info:
+            for key in ("model", "serial", "firmware", "wwn"):
+                if getattr(info, key):
+                    meta[key] = str(getattr(info, key)).strip()
     except: pass
+    if "wwn" not in meta:
+        base = os.path.basename(device)
+        for p in (f"/sys/block/{base}/wwid", f"/sys/block/{base}/device/wwid"):
+            try:
+                with open(p) as f:
+                    meta["wwn"] = f.read().strip()
+                break
+            except OSError:
+                pass
+    dev = INVENTORY.get(device)
+    if dev is not None:
+        for key in ("model", "serial", "wwn"):
+            if not meta.get(key) and getattr(dev, key):
+                meta[key] = getattr(dev, key)
     try:
-        size = run_cmd(f"blockdev --getsize64 {device}")
+        size = str(dev.size) if dev is not None and dev.size else run_cmd(f"blockdev --getsize64 {device}")
         if size:
             meta["capacity_bytes"] = size
             meta["capacity_human"] = f"{int(size)//(1024**3)} GB"
@@ -74,6 +118,44 @@ def collect_device_metadata(device):
 
 VERSION = "1.0.0"
 
+# - Overwrite engine settings -
+OVERWRITE_BACKEND = "direct"  # "direct" (in-process O_DIRECT engine) or "dd"
+WRITE_THREADS = None          # striped writer threads; None = pick per device class
+DEFAULT_WRITE_THREADS = {
+    "nvme": 8,      # needs many outstanding I/Os to reach rated bandwidth
+    "ata_ssd": 4,
+    "ata": 1,       # rotational: parallel stripes only add seeks
+    "usb": 1,
+    "unknown": 1,
+}
+SAMPLE_CONFIDENCE = 0.99      # sampled verification: probability of catching...
+SAMPLE_TOLERANCE = 0.001      # ...a device with at least this fraction of blocks left dirty
+VERIFY_DIRECT = True          # verification reads with O_DIRECT (else drop cached pages first)
+MERKLE_DIGEST = True          # full verification also records a Merkle root over device regions
+INLINE_LAG = 256 * 1024**2    # inline verification: unread written bytes before the writer waits
+INLINE_BATCH = 64 * 1024**2   # rotational media: read back in sweeps of this many bytes (SSDs per chunk)
+REMEDIATE = True              # after a failed full verification, rewrite and re-verify only the bad ranges
+DIRTY_LIMIT = 1024**3         # verification keeps mapping bad regions until this many bytes are dirty
+VERIFY_MODE = "read"          # full verification scanner: "read" (readinto/preadv) or "mmap"
+VERIFY_THREADS = None         # full verification reader threads; None = same per-class default as writers
+IO_BACKEND = "threads"        # "aio" = Linux native AIO, falls back to threads if unavailable
+IO_MODE = "direct"            # "buffered" = page cache with bounded writeback (hosts wiping many drives)
+# AIO_QUEUE_DEPTH, CHECKPOINT_EVERY, WRITEBACK_WINDOW (wipe_engine) and MERKLE_REGION (merkle)
+# are imported above; assign them here to override the engine defaults for every wipe.
+SHRED_SCHEDULE = ["random", "random", "random", "zero"]  # passes; "0x55"-style fixed patterns allowed
+ATA_FALLBACK_PASSES = 3       # random passes when 'auto' finds no ATA secure erase
+ZERO_CHECK = "memcmp"          # verification zero test: "memcmp", or "numpy" when numpy is installed
+AUTOTUNE = True               # probe block size / queue depth at the start of each wipe
+ZERO_OFFLOAD = True           # Zero Fill via BLKZEROOUT (kernel/device clears ranges), streaming as fallback
+ZERO_DISCARD = None           # also deallocate first: None, "discard" or "secdiscard" (where the device allows)
+AUTOTUNE_DEPTHS = {
+    "nvme": (1, 4, 8, 16),
+    "ata_ssd": (1, 2, 4),
+    "ata": (1,),
+    "usb": (1, 2),
+    "unknown": (1, 2),
+}
+
 def script_sha256():
     try:
         return sha256_of_file(__file__)
@@ -81,62 +163,161 @@ def script_sha256():
         return None
 
 
+# - Preflight -
+PREFLIGHT_TIMEOUT = 10  # seconds a preflight task may take before the wipe goes ahead without it
+
+def preflight(tasks, timeout=PREFLIGHT_TIMEOUT):
+    """Run name -> (fn, args, default[, timeout]) tasks in parallel; returns (results, report)"""
+    # A task that raises or times out yields its default and is left running,
+    # so tasks must not write to the wipe log themselves.
+    started = time.monotonic()
+    durations = {}
+
+    def timed(name, fn, args):
+        t = time.monotonic()
+        try:
+            return fn(*args)
+        finally:
+            durations[name] = time.monotonic() - t
+
+    pool = ThreadPoolExecutor(max_workers=max(1, len(tasks)))
+    futures = {name: pool.submit(timed, name, spec[0], spec[1]) for name, spec in tasks.items()}
+    results, report = {}, {}
+    for name, future in futures.items():
+        default = tasks[name][2]
+        limit = tasks[name][3] if len(tasks[name]) > 3 else timeout
+        try:
+            results[name] = future.result(
+                None if limit is None else max(0, started + limit - time.monotonic()))
+            status = "ok"
+        except TaskTimeout:
+            results[name], status = default, "timeout"
+        except Exception as e:
+            results[name], status = default, f"error: {e}"
+        seconds = durations.get(name, time.monotonic() - started)
+        report[name] = {"seconds": round(seconds, 3), "status": status}
+    pool.shutdown(wait=False)
+    return results, {"tasks": report, "seconds": round(time.monotonic() - started, 3)}
+
+
 # - Device Detection -
-def list_block_devices():
-    devices = []
+INVENTORY_BACKEND = "sysfs"  # "sysfs" (reads /sys, no subprocess) or "lsblk" (one lsblk --json call)
+INVENTORY = Inventory(INVENTORY_BACKEND)  # records cached between refreshes
+SMART_CACHE = "/var/log/NullBytes/smart_cache.json"  # smartctl identity per WWN/serial, across runs
+SMART = SmartCache(SMART_CACHE)
+
+def smart_identity(device):
+    """Cached smartctl identity of the drive behind device; None without smartctl"""
+    if not check_dependency("smartctl"):
+        return None
+    dev = INVENTORY.get(device)
+    identity = {"wwn": dev.wwn, "serial": dev.serial, "size": dev.size} if dev else {}
     try:
-        out = subprocess.check_output("lsblk -dpno NAME,SIZE,MODEL | grep -v 'loop\\|sr0'", shell=True, text=True)
-        for line in out.splitlines():
-            parts = line.split(None, 2)
-            if len(parts) >= 2:
-                dev = parts[0]
-                info = ' '.join(parts[1:])
-                devices.append((dev, info))
-    except Exception:
+        # bumped by the kernel for every new disk or medium behind the node
+        with open(f"/sys/class/block/{os.path.basename(os.path.realpath(device))}/diskseq") as f:
+            identity["diskseq"] = f.read().strip()
+    except OSError:
         pass
-    return devices
+    return SMART.lookup(device, identity)
+
+def _forget_node(event):
+    # another drive may now sit behind this node: check its identity on next use
+    if event.get("SUBSYSTEM") == "block" and event.get("DEVTYPE") == "disk":
+        SMART.forget("/dev/" + block_name(event))
+
+HOTPLUG = True  # keep INVENTORY current from kernel uevents; polling is the fallback
+_hotplug = None
+_hotplug_lock = threading.Lock()
+
+def hotplug_service():
+    """Shared HotplugService over INVENTORY; None when HOTPLUG is off or unavailable"""
+    global _hotplug
+    with _hotplug_lock:
+        if _hotplug is None and HOTPLUG:
+            try:
+                _hotplug = HotplugService(INVENTORY).start()
+                _hotplug.listeners.append(_forget_node)
+            except OSError:
+                _hotplug = False
+    return _hotplug or None
+
+def list_block_devices():
+    return [(dev.path, dev.label()) for dev in INVENTORY.devices()]
 
 def detect_device_type(device):
+    """Interface class of device, cached on its inventory record until the next refresh"""
+    dev = INVENTORY.get(device)
+    if dev is not None and dev.interface:
+        return dev.interface
+    dtype = _probe_device_type(device, dev)
+    if dev is not None:
+        dev.interface = dtype
+    return dtype
+
+def _probe_device_type(device, dev=None):
     base = os.path.basename(device)
 
     # NVMe is reliable
     if base.startswith('nvme'):
         return 'nvme'
 
-    # Try lsblk TRAN column first
-    try:
-        tran = run_cmd(f"lsblk -ndo TRAN {device}")
-        if tran:
-            tran = tran.strip().lower()
-            if tran == "nvme":
-                return "nvme"
-            if tran == "usb":
-                return "usb"
-            if tran in ("sata", "ata"):
-                return "ata"
-    except Exception:
-        pass
-
-    # Fallback: smartctl
-    if check_dependency("smartctl"):
+    # Transport from the inventory first
+    if dev is not None:
+        hint = dev.interface_hint()
+        if hint:
+            return hint
+    else:
         try:
-            info = run_cmd(f"smartctl -i {device}")
-            if info:
-                if "NVMe" in info:
+            tran = run_cmd(f"lsblk -ndo TRAN {device}")
+            if tran:
+                tran = tran.strip().lower()
+                if tran == "nvme":
                     return "nvme"
-                if "USB" in info or "Transport protocol:  USB" in info:
+                if tran == "usb":
                     return "usb"
-                if "ATA" in info or "SATA" in info:
+                if tran in ("sata", "ata"):
                     return "ata"
         except Exception:
             pass
 
+    # Fallback: smartctl (cached per drive)
+    try:
+        info = smart_identity(device)
+        if info and info.interface():
+            return info.interface()
+    except Exception:
+        pass
+
     # Final heuristic
     if base.startswith("sd"):
         return "ata"
     return "unknown"
 
 
+def device_class(device, dtype=None):
+    """detect_device_type, with non-rotational ATA split out as 'ata_ssd'"""
+    dtype = dtype or detect_device_type(device)
+    if dtype == "ata" and sysfs_queue_attr(device, "rotational") == "0":
+        return "ata_ssd"
+    return dtype
+
+def default_write_threads(device, dtype=None):
+    """Striped writer count for the device class (WRITE_THREADS overrides)"""
+    if WRITE_THREADS:
+        return WRITE_THREADS
+    return DEFAULT_WRITE_THREADS.get(device_class(device, dtype), 1)
+
+def default_verify_threads(device, dtype=None):
+    if VERIFY_THREADS:
+        return VERIFY_THREADS
+    return DEFAULT_WRITE_THREADS.get(device_class(device, dtype), 1)
+
+def autotune_depths(device, dtype=None):
+    if WRITE_THREADS:
+        return (WRITE_THREADS,)
+    return AUTOTUNE_DEPTHS.get(device_class(device, dtype), (1,))
+
+
 # - Unmount the device -
 def unmount_device(device, logf):
     try:
@@ -153,20 +334,40 @@ def unmount_device(device, logf):
                 subprocess.run(["umount", "-l", part], check=True)
             except Exception as e:
                 logf.write(f"Could not unmount {part}: {e}\n")
-        time.sleep(2)
+        service = hotplug_service()
+        if service is None:
+            time.sleep(2)
+        else:
+            # done once the device's uevents have died down, not after a fixed delay
+            service.settle(touches_device(device), quiet=0.2, timeout=2)
         return True
     except Exception as e:
         logf.write(f"Unmount error: {e}\n")
         return False
 
 # - Quick Wipe the USB -
-def find_partition(device, retries=10, delay=1):
-    """Poll /dev until a child partition appears (e.g., /dev/sdb1)"""
+def _first_partition(base):
+    for p in sorted(os.listdir("/dev")):
+        if p.startswith(base) and p != base:
+            return "/dev/" + p
+    return None
+
+def find_partition(device, retries=10, delay=1, number=None, since=None):
+    """Wait for a child partition (e.g., /dev/sdb1): its uevent since `since`, else poll /dev"""
     base = os.path.basename(device)
+    service = hotplug_service()
+    if service is not None:
+        if since is None:
+            since = service.mark()
+            found = _first_partition(base)
+            if found:
+                return found
+        event = service.wait_for(partition_added(device, number), retries * delay, since)
+        return "/dev/" + block_name(event) if event else _first_partition(base)
     for _ in range(retries):
-        for p in os.listdir("/dev"):
-            if p.startswith(base) and p != base:
-                return "/dev/" + p
+        found = _first_partition(base)
+        if found:
+            return found
         time.sleep(delay)
     return None
 
@@ -198,13 +399,15 @@ def quick_wipe_usb(device, logf):
 
         # --- Partition table ---
         logf.write("Creating new partition table...\n")
+        service = hotplug_service()
+        mark = service.mark() if service else None
         subprocess.run(["parted", "-s", device, "mklabel", "msdos"], check=True, timeout=10)
         subprocess.run(["parted", "-s", device, "mkpart", "primary", "fat32", "0%", "100%"],
                        check=True, timeout=10)
 
         # --- Find partition ---
         logf.write("Waiting for new partition...\n")
-        part = find_partition(device, retries=10, delay=1)
+        part = find_partition(device, retries=10, delay=1, number=1, since=mark)
         if not part:
             logf.write("Partition not found after wipe.\n")
             return False, "partition_not_found"
@@ -276,39 +479,32 @@ def ata_secure_erase(device, logf):
             logf.write(f"Secure erase failed, code={proc.returncode}\n")
             return False, "secure_erase_failed"
     else:
-        logf.write("Secure erase not supported. Falling back to multi-pass random overwrite.\n")
-        success = random_overwrite(device, passes=3, block_size=1024*1024, logf=logf)
-        return (success, "random_overwrite_ok" if success else "random_overwrite_failed")
+        # run_wipe falls back to random_overwrite with a journal
+        logf.write("Secure erase not supported.\n")
+        return False, "secure_erase_unsupported"
+
+
+def random_overwrite(device, passes=ATA_FALLBACK_PASSES, logf=None, cancel_flag=None,
+                     progress=None, journal=None, **engine_opts):
+    """Multi-pass random overwrite, a fresh keystream seed per pass"""
+    success, status = multipass_overwrite(device, ["random"] * passes, logf=logf,
+                                          cancel_flag=cancel_flag, progress=progress,
+                                          journal=journal, **engine_opts)
+    if success:
+        if logf: logf.write("Random overwrite complete.\n")
+        return True, "random_overwrite_ok"
+    return False, status if status == "cancelled_by_user" else "random_overwrite_failed"
 
 
-def random_overwrite(device, passes=3, block_size=1024*1024, logf=None):
-    try:
-        size_output = run_cmd(f"blockdev --getsize64 {device}")
-        if not size_output:
-            if logf: logf.write("Could not get device size.\n")
-            return False
-        size = int(size_output)
-        if logf: logf.write(f"Device size: {size} bytes\n")
-
-        with open(device, "wb") as f:
-            for p in range(passes):
-                if logf: logf.write(f"Pass {p+1}/{passes}\n")
-                written = 0
-                while written < size:
-                    data = os.urandom(min(block_size, size - written))
-                    f.write(data)
-                    written += len(data)
-                f.flush()
-                os.fsync(f.fileno())
-
-        if logf: logf.write("Random overwrite complete.\n")
-        return True
-    except PermissionError:
-        if logf: logf.write("Permission denied. Run as root!\n")
-        return False
-    except Exception as e:
-        if logf: logf.write(f"Random overwrite error: {e}\n")
-        return False
+def shred_overwrite(device, logf=None, cancel_flag=None, progress=None, journal=None,
+                    schedule=None, **engine_opts):
+    """In-process shred_zero_cmd: one pass per entry of schedule (default SHRED_SCHEDULE)"""
+    success, status = multipass_overwrite(device, schedule or SHRED_SCHEDULE, logf=logf,
+                                          cancel_flag=cancel_flag, progress=progress,
+                                          journal=journal, **engine_opts)
+    if success:
+        return True, "shred_ok"
+    return False, status if status == "cancelled_by_user" else "shred_failed"
 
 
 def nvme_sanitize(device, logf):
@@ -357,45 +553,223 @@ def shred_zero_cmd(device):
     return f"shred -v -n 3 {device} && dd if=/dev/zero of={device} bs=4M status=progress conv=fsync"
 
 # - Verification -
-def verify_sampled(device, logf, samples=16):
-    logf.write(f"[{datetime.now().isoformat()}] Sampled verification: {samples} samples\n")
+def verify_sampled(device, logf, confidence=None, tolerance=None, seed=None, report=None,
+                   cancel_flag=None, pattern=None):
+    """Stratified random sample sized to catch `tolerance` dirty blocks with `confidence`"""
+    confidence = confidence or SAMPLE_CONFIDENCE
+    tolerance = tolerance or SAMPLE_TOLERANCE
     try:
-        size_bytes = int(subprocess.check_output(f"blockdev --getsize64 {device}", shell=True, text=True).strip())
+        size_bytes = device_size(device)
+        plan = SamplePlan(size_bytes, physical_block_size(device), confidence, tolerance, seed)
     except Exception as e:
-        logf.write(f"blockdev failed: {e}\n")
+        logf.write(f"Sample plan failed: {e}\n")
         return False
-    import random
-    offsets = [0, max(0, size_bytes-4096)]
-    for _ in range(max(0, samples-2)):
-        offsets.append(random.randrange(0, max(1, size_bytes-4096)))
+    logf.write(f"[{datetime.now().isoformat()}] Sampled verification: {len(plan.offsets)} blocks "
+               f"of {plan.block_size} bytes, seed {plan.seed}, confidence {confidence} "
+               f"at tolerance {tolerance}\n")
+    dirty_map = DirtyMap(DIRTY_LIMIT)
     try:
-        with open(device, 'rb') as f:
-            for off in offsets:
-                f.seek(off)
-                data = f.read(4096)
-                if any(b != 0 for b in data):
-                    logf.write(f"Non-zero data at {off}\n")
-                    return False
+        dirty = sampled_scan_zero(device, plan, ZERO_CHECK, cancel_flag, VERIFY_DIRECT, pattern,
+                                  dirty_map)
+        if dirty is not None:
+            logf.write(f"Unexpected data at {dirty}\n")
+            log_dirty_map(logf, dirty_map)
+            return False
         return True
+    except Cancelled:
+        logf.write("Sampled verification cancelled.\n")
+        return False
     except Exception as e:
         logf.write(f"Sampled verify exception: {e}\n")
         return False
-
-def verify_full(device, logf):
-    logf.write(f"[{datetime.now().isoformat()}] Full verification started.\n")
-    block_size = 1024*1024
+    finally:
+        if report is not None:
+            report["sample_plan"] = plan.as_dict()
+            report["dirty_map"] = dirty_map.as_dict()
+        logf.write(f"Checked {plan.checked} samples, confidence achieved "
+                   f"{plan.as_dict()['confidence_achieved']}\n")
+
+def verify_full_aio(device, logf, block_size=1024*1024, depth=32, cancel_flag=None, info=None,
+                    pattern=None, dirty_map=None, on_block=None):
+    """Full scan through Linux AIO; returns the first mismatching offset or None"""
+    matches = block_checker(pattern, ZERO_CHECK)
+    fd, direct = open_target(device, write=False)
     try:
-        with open(device,'rb') as f:
-            while True:
-                data = f.read(block_size)
-                if not data: break
-                if any(b!=0 for b in data):
-                    logf.write("Non-zero found during full verification\n")
+        mode = "o_direct" if direct else drop_cached_pages(device, fd)
+        if info is not None:
+            info["read_mode"] = f"aio+{mode}"
+        size = device_size(device, fd)
+        body = round_down(size, logical_block_size(device, fd)) if direct else size
+        dirty = []
+        def check(view, offset):
+            if on_block is not None:
+                on_block(view, offset)
+            if not matches(view, offset):
+                dirty.append(offset)
+                if dirty_map is None:
                     return False
+                if not dirty_map.full:
+                    record_mismatch(dirty_map, view, offset, matches)
+                return on_block is not None or not dirty_map.full
+        stats = aio_read(fd, 0, body, block_size, check, depth, cancel_flag)
+        logf.write(stats.summary() + "\n")
+        if body < size and (not dirty or dirty_map is not None):
+            with open(device, 'rb') as f:
+                f.seek(body)
+                check(f.read(size - body), body)
+    finally:
+        os.close(fd)
+    if dirty_map is not None:
+        return dirty_map.first
+    return min(dirty) if dirty else None
+
+def log_dirty_map(logf, dirty_map, shown=20):
+    info = dirty_map.as_dict()
+    logf.write(f"Bad-region map: {info['dirty_bytes']} dirty bytes in {info['range_count']} "
+               f"range(s){' (stopped at limit)' if info['stopped_at_limit'] else ''}\n")
+    for start, end in info["ranges"][:shown]:
+        logf.write(f"  dirty [{start}, {end}) {end - start} bytes\n")
+    if info["range_count"] > shown:
+        logf.write(f"  ... {info['range_count'] - shown} more range(s)\n")
+
+def verify_full(device, logf, block_size=1024*1024, depth=AIO_QUEUE_DEPTH, cancel_flag=None,
+                report=None, pattern=None, merkle_sidecar=None):
+    """Read back the whole device and compare it with pattern (zeros when None)"""
+    # Scanning continues past a mismatch until DIRTY_LIMIT bytes are dirty; with
+    # MERKLE_DIGEST the blocks read are also hashed into merkle_sidecar.
+    logf.write(f"[{datetime.now().isoformat()}] Full verification started.\n")
+    info = {}
+    dirty_map = DirtyMap(DIRTY_LIMIT)
+    try:
+        hasher = None
+        if MERKLE_DIGEST and merkle_sidecar:
+            hasher = RegionHasher(device_size(device), MERKLE_REGION)
+        on_block = hasher.update if hasher else None
+        if IO_BACKEND == 'aio' and aio_available():
+            dirty = verify_full_aio(device, logf, block_size, depth, cancel_flag, info, pattern,
+                                    dirty_map, on_block)
+        elif VERIFY_MODE == 'mmap':
+            dirty = mmap_scan_zero(device, block_size=block_size, zero_check=ZERO_CHECK,
+                                   cancel_flag=cancel_flag, report=info, pattern=pattern,
+                                   dirty_map=dirty_map, on_block=on_block)
+        elif depth > 1:
+            logf.write(f"Reading {depth} stripes in parallel.\n")
+            dirty = parallel_scan_zero(device, depth, block_size, ZERO_CHECK, cancel_flag,
+                                       direct=VERIFY_DIRECT, report=info, pattern=pattern,
+                                       dirty_map=dirty_map, on_block=on_block,
+                                       stripe_align=MERKLE_REGION if hasher else STRIPE_ALIGN)
+        else:
+            dirty = scan_zero(device, block_size=block_size, zero_check=ZERO_CHECK,
+                              cancel_flag=cancel_flag, direct=VERIFY_DIRECT, report=info,
+                              pattern=pattern, dirty_map=dirty_map, on_block=on_block)
+        if hasher:
+            tree = hasher.tree()
+            tree.save(merkle_sidecar)
+            if report is not None:
+                report["merkle"] = dict(tree.as_dict(), sidecar=merkle_sidecar)
+            logf.write(f"Merkle root ({tree.algorithm}, {len(tree.leaves)} regions of "
+                       f"{tree.region_size} bytes): {tree.root.hex()}\n")
+        if dirty is not None:
+            logf.write(f"Unexpected data found during full verification near {dirty}\n")
+            log_dirty_map(logf, dirty_map)
+            return False
         return True
+    except Cancelled:
+        logf.write("Full verification cancelled.\n")
+        return False
     except Exception as e:
         logf.write(f"Full verify failed: {e}\n")
         return False
+    finally:
+        if info:
+            logf.write(f"Verification read mode: {info['read_mode']}\n")
+        if report is not None:
+            report["verify_read_mode"] = info.get("read_mode")
+            report["dirty_map"] = dirty_map.as_dict()
+
+def inline_verifier(device, block_size=1024*1024):
+    """InlineVerifier for the final overwrite pass, batching read-back on rotational media"""
+    batch = INLINE_BATCH if sysfs_queue_attr(device, "rotational") == "1" else 0
+    return InlineVerifier(device, INLINE_LAG, batch, block_size, ZERO_CHECK, VERIFY_DIRECT,
+                          DirtyMap(DIRTY_LIMIT))
+
+def verify_inline(device, logf, verifier, block_size=1024*1024, cancel_flag=None, report=None,
+                  pattern=None):
+    """Finish read-after-write verification by scanning what the verifier never read back"""
+    dirty_map = verifier.dirty_map
+    try:
+        if verifier.error is not None:
+            logf.write(f"Inline verify failed: {verifier.error}\n")
+            return False
+        size = device_size(device)
+        gaps, pos = [], 0
+        for start, end in verifier.covered.intervals():
+            if start > pos:
+                gaps.append((pos, start))
+            pos = max(pos, end)
+        if pos < size:
+            gaps.append((pos, size))
+        logf.write(f"Inline verification read back {verifier.covered.dirty_bytes()} bytes "
+                   f"(at most {verifier.max_behind} behind the writer).\n")
+        if gaps:
+            logf.write(f"Scanning {sum(end - start for start, end in gaps)} bytes "
+                       f"not read back inline.\n")
+            scan_ranges(device, gaps, block_size, ZERO_CHECK, cancel_flag, VERIFY_DIRECT,
+                        pattern, dirty_map)
+        dirty = dirty_map.first
+        if dirty is not None:
+            logf.write(f"Unexpected data found during inline verification near {dirty}\n")
+            log_dirty_map(logf, dirty_map)
+            return False
+        return True
+    except Cancelled:
+        logf.write("Inline verification cancelled.\n")
+        return False
+    except Exception as e:
+        logf.write(f"Inline verify failed: {e}\n")
+        return False
+    finally:
+        if report is not None:
+            report["inline_verify"] = verifier.as_dict()
+            report["verify_read_mode"] = verifier.read_mode
+            report["dirty_map"] = dirty_map.as_dict()
+
+# - Remediation -
+def remediate(device, logf, dirty_map, pattern=None, block_size=DEFAULT_CHUNK, cancel_flag=None,
+              merkle=None):
+    """Rewrite and re-verify only the dirty-map ranges; returns the certificate record"""
+    ranges = dirty_map["ranges"]
+    record = {"ranges": len(ranges), "dirty_bytes": dirty_map["dirty_bytes"],
+              "status": None, "verified_clean": False}
+    if dirty_map["stopped_at_limit"] or dirty_map["range_count"] > dirty_map["ranges_listed"]:
+        logf.write("Too many bad regions to remediate in place; a full re-wipe is needed.\n")
+        record["status"] = "skipped_too_many_regions"
+        return record
+    logf.write(f"[{datetime.now().isoformat()}] Remediation: rewriting {len(ranges)} range(s), "
+               f"{dirty_map['dirty_bytes']} dirty bytes\n")
+    ok, status, written = rewrite_ranges(device, ranges, pattern or ZeroPattern(), block_size,
+                                         logf, cancel_flag)
+    record.update(status=status, bytes_rewritten=written)
+    if not ok:
+        return record
+    recheck = DirtyMap(DIRTY_LIMIT)
+    try:
+        dirty = scan_ranges(device, ranges, zero_check=ZERO_CHECK, cancel_flag=cancel_flag,
+                            direct=VERIFY_DIRECT, pattern=pattern, dirty_map=recheck)
+    except Cancelled:
+        record["status"] = "cancelled_by_user"
+        return record
+    record["reverify_dirty_map"] = recheck.as_dict()
+    record["verified_clean"] = dirty is None
+    if dirty is not None:
+        logf.write("Remediated ranges still fail verification.\n")
+        log_dirty_map(logf, recheck)
+    if merkle and merkle.get("sidecar"):
+        tree, regions = refresh_regions(device, merkle["sidecar"], ranges, direct=VERIFY_DIRECT)
+        merkle.update(tree.as_dict(), refreshed_regions=regions)
+        logf.write(f"Merkle root after remediation: {tree.root.hex()}\n")
+    logf.write(f"Remediation re-verify: {'PASSED' if dirty is None else 'FAILED'}\n")
+    return record
 
 # - Certificates -
 def write_certificate(device, method, log_file, status, verified_clean, extra):
@@ -460,15 +834,12 @@ def wipe_android():
         return status, False, meta
 
     messagebox.showinfo("Rebooting", "Device will reboot to fastboot mode...")
+    service = hotplug_service()
+    mark = service.mark() if service else None
     run_cmd("adb reboot bootloader")
 
-    fastboot_id = None
-    for _ in range(300):
-        out = run_cmd("fastboot devices")
-        if out:
-            fastboot_id = out.split()[0]
-            break
-        time.sleep(1)
+    out = wait_for_fastboot(lambda: run_cmd("fastboot devices"), 300, service, mark)
+    fastboot_id = out.split()[0] if out else None
 
     if not fastboot_id:
         status = "fastboot_timeout"
@@ -631,6 +1002,8 @@ class WipeApp:
         ctrl.pack(fill='x', pady=8)
         ttk.Button(ctrl,text='Start Wipe',command=self.start).pack(side='left')
         ttk.Button(ctrl,text='Open Logs',command=self.open_logs_dir).pack(side='left',padx=6)
+        self.resume_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(ctrl,text='Resume interrupted wipe',variable=self.resume_var).pack(side='left',padx=6)
         self.cancel_btn = ttk.Button(ctrl,text='Cancel',command=self.cancel,state='disabled')
         self.cancel_btn.pack(side='right')
 
@@ -649,6 +1022,9 @@ class WipeApp:
         self.status_frame = None
 
         self.refresh_devices()
+        service = hotplug_service()
+        if service is not None:
+            service.listeners.append(self.on_hotplug)
         self.startup_loader.stop()
         self.startup_loader.destroy()
 
@@ -696,7 +1072,7 @@ class WipeApp:
             'auto': "Automatic secure wipe using hardware commands (ATA Secure Erase or NVMe Sanitize). NIST category: Purge.",
             'zero': "Overwrites all sectors with zeros. Simple clear operation. NIST category: Clear.",
             'random': "Overwrites all sectors with random data. Clear operation with stronger obfuscation. NIST category: Clear.",
-            'shred': "Multiple overwrite passes (default 3) with random data followed by zero fill. NIST category: Clear (Close to Clear).",
+            'shred': f"Multiple overwrite passes ({', '.join(SHRED_SCHEDULE)}) in a single in-process run, ending with a zero fill. NIST category: Clear (Close to Clear).",
             'quick': "Quick wipe for USB drives. Removes filesystem signatures, zeroes key areas, recreates partition table, and formats as FAT32. NIST category: Clear.",
         }
         self.method_desc.config(state='normal')
@@ -712,7 +1088,8 @@ class WipeApp:
         if device_label == 'Android (ADB)':
             options = [('None','none')]
         else:
-            options = [('None','none'),('Sampled (fast check of random blocks)', 'sampled'),('Full (slow check of all blocks)', 'full')]
+            options = [('None','none'),('Sampled (fast check of random blocks)', 'sampled'),('Full (slow check of all blocks)', 'full'),
+                       ('Inline (check each block right after writing it)', 'inline')]
 
         self.verify_var.set(options[0][1])
         for text,val in options:
@@ -725,7 +1102,25 @@ class WipeApp:
         self.log.insert(tk.END, f"[{ts}] {text}\n")
         self.log.see(tk.END)
 
+    def progress_reporter(self, logf, label="Written"):
+        def report(done, total, elapsed, stage=None):
+            rate = done / elapsed / (1024**2) if elapsed > 0 else 0
+            pct = 100 * done // total if total else 100
+            line = f"{label} {done//(1024**2)} / {total//(1024**2)} MiB ({pct}%) {rate:.1f} MiB/s"
+            if stage:
+                line = f"{stage}: {line}"
+            logf.write(line + "\n")
+            self.append_log(line)
+        return report
+
     def refresh_devices(self):
+        INVENTORY.refresh()
+        self.update_device_list()
+        self.device_combo.bind("<<ComboboxSelected>>", self.on_device_selected)
+
+    def update_device_list(self, keep_selection=False):
+        """Rebuild the device list from the cached inventory"""
+        current = self.device_combo.get()
         self.devices = list_block_devices()
         labels = []
         for d,info in self.devices:
@@ -733,10 +1128,17 @@ class WipeApp:
             labels.append(f"{d} ({dtype.upper()}) — {info}")
         labels.append('Android (ADB)')
         self.device_combo['values'] = labels
+        if keep_selection and (current in labels or str(self.device_combo.cget('state')) == 'disabled'):
+            return  # selection still valid, or a wipe is running
         if labels:
             self.device_combo.set(labels[0])
             self.on_device_selected(None)
-        self.device_combo.bind("<<ComboboxSelected>>", self.on_device_selected)
+
+    def on_hotplug(self, event):
+        # service thread: hand the list update to the Tk loop
+        if (event.get("SUBSYSTEM") == "block" and event.get("DEVTYPE") == "disk"
+                and event.get("ACTION") in ("add", "remove")):
+            self.root.after(0, lambda: self.update_device_list(keep_selection=True))
 
     def on_device_selected(self, event):
         sel = self.device_combo.get()
@@ -793,7 +1195,7 @@ class WipeApp:
             threading.Thread(target=self.run_android,daemon=True).start()
         else:
             device = sel.split()[0]
-            threading.Thread(target=self.run_wipe,args=(device,method,verify),daemon=True).start()
+            threading.Thread(target=self.run_wipe,args=(device,method,verify,self.resume_var.get()),daemon=True).start()
 
     def run_android(self):
         self.lock_ui()
@@ -801,7 +1203,7 @@ class WipeApp:
         self.append_log(f"Android wipe finished: {status}, verified: {verified}")
         self.unlock_ui()
 
-    def run_wipe(self,device,method,verify):
+    def run_wipe(self,device,method,verify,resume=False):
         self.lock_ui()
         log_dir = '/var/log/NullBytes'
         try:
@@ -816,20 +1218,42 @@ class WipeApp:
         try:
             self.append_log(f"Starting wipe on {device} with method '{method}' and verification '{verify}'.")
             logf.write(f"Wipe initiated at {datetime.now().isoformat()} on {device}\n")
-            sysmeta = collect_system_metadata()
-            devmeta = collect_device_metadata(device)
+            wipe_meta = {}
             success = False
 
-            unmount_success = unmount_device(device, logf)
+            unmount_log = io.StringIO()  # merged into logf once preflight is done
+            found, wipe_meta["preflight"] = preflight({
+                "system_metadata": (collect_system_metadata, (), {}),
+                # on timeout the certificate still names the drive: serial, WWN, size
+                "device_metadata": (collect_device_metadata, (device,), inventory_identity(device)),
+                "script_sha256": (script_sha256, (), None),
+                # no timeout: umount -f / -l can take 10 s per partition, and the
+                # wipe must never start writing under a live mount
+                "unmount": (unmount_device, (device, unmount_log), False, None),
+            })
+            logf.write(unmount_log.getvalue())
+            sysmeta, devmeta = found["system_metadata"], found["device_metadata"]
+            logf.write(f"Preflight done in {wipe_meta['preflight']['seconds']}s: "
+                       + ", ".join(f"{k} {v['seconds']}s ({v['status']})"
+                                   for k, v in wipe_meta["preflight"]["tasks"].items()) + "\n")
+            if devmeta.get("identity_source") == "inventory":
+                self.append_log("Device metadata timed out; using the inventory identity.")
+                logf.write(f"Device metadata timed out; inventory identity: {devmeta}\n")
+            unmount_success = found["unmount"]
             if not unmount_success:
                 self.append_log("WARNING: Could not unmount all partitions. Continuing anyway.")
                 logf.write("WARNING: Could not unmount all partitions. Continuing anyway.\n")
 
 
+            fallback = None  # in-process schedule when 'auto' has to overwrite instead
             if method=='auto':
                 dtype = detect_device_type(device)
                 if dtype=='ata':
                     success,status = ata_secure_erase(device,logf)
+                    if status == 'secure_erase_unsupported':
+                        self.append_log("Secure erase not supported, falling back to multi-pass random overwrite.")
+                        logf.write("Falling back to multi-pass random overwrite.\n")
+                        fallback = ["random"] * ATA_FALLBACK_PASSES
                 elif dtype=='nvme':
                     success,status = nvme_sanitize(device,logf)
                 else: # Fallback for USB/Unknown
@@ -837,7 +1261,97 @@ class WipeApp:
                     logf.write("Auto method not applicable, falling back to Zero Fill.\n")
                     method = 'zero' # proceed to the zero fill block
 
-            if method=='zero':
+            engine_opts = {
+                "threads": default_write_threads(device, devmeta.get("interface")),
+                "block_size": DEFAULT_CHUNK,
+                "io_backend": IO_BACKEND,
+                "aio_depth": AIO_QUEUE_DEPTH,
+                "checkpoint_every": CHECKPOINT_EVERY,
+                "io_mode": IO_MODE,
+                "writeback_window": WRITEBACK_WINDOW,
+            }
+            read_block = 1024*1024
+            read_depth = (AIO_QUEUE_DEPTH if IO_BACKEND == 'aio'
+                          else default_verify_threads(device, devmeta.get("interface")))
+            journal = None
+            if fallback or (OVERWRITE_BACKEND == 'direct' and method in ('zero', 'random', 'shred')):
+                schedule = fallback or (SHRED_SCHEDULE if method == 'shred' else [method])
+                journal = WipeJournal.open(journal_path(log_dir, devmeta), devmeta, method, schedule,
+                                           engine_opts, logf.name, resume=resume, logf=logf,
+                                           size=device_size(device))
+                if journal.resumed:
+                    engine_opts.update(journal.state["engine"])
+                    if journal.state.get("autotune"):
+                        wipe_meta["autotune"] = journal.state["autotune"]
+                    msg = (f"Resuming pass {journal.pass_index + 1}/{len(schedule)} "
+                           f"at offset {journal.offset}.")
+                    self.append_log(msg)
+                    logf.write(msg + "\n")
+                elif resume:
+                    self.append_log("No matching journal found, starting from the beginning.")
+            offload = (method == 'zero' and OVERWRITE_BACKEND == 'direct' and ZERO_OFFLOAD
+                       and is_block_device(device))
+            if AUTOTUNE and journal is not None and not journal.resumed and not offload:
+                self.append_log("Probing block sizes and queue depths...")
+                try:
+                    tune = autotune(device, 'zero' if method == 'zero' else 'random',
+                                    depths=autotune_depths(device, devmeta.get("interface")),
+                                    io_backend=IO_BACKEND, verify=(verify in ('full', 'inline')),
+                                    logf=logf, cancel_flag=self.cancel_flag,
+                                    default=(engine_opts["block_size"],
+                                             engine_opts["aio_depth" if IO_BACKEND == 'aio' else "threads"]))
+                except OSError as e:
+                    # a probe that cannot write or open O_DIRECT must not stop the wipe
+                    wipe_meta["autotune"] = {"error": str(e)}
+                    self.append_log(f"Autotune failed ({e}); using the default block size and writers.")
+                    logf.write(f"Autotune failed: {e}; keeping block {engine_opts['block_size']}, "
+                               f"{engine_opts['threads']} writer(s).\n")
+                else:
+                    wipe_meta["autotune"] = tune.as_dict()
+                    if tune.write_block:
+                        engine_opts["block_size"] = tune.write_block
+                        engine_opts["aio_depth" if tune.io_backend == 'aio' else "threads"] = tune.write_depth
+                    if tune.read_block:
+                        read_block, read_depth = tune.read_block, tune.read_depth
+                    self.append_log(f"Autotune picked block {engine_opts['block_size']} for writes, "
+                                    f"{read_block} for reads.")
+            wipe_meta["engine"] = dict(engine_opts, backend=OVERWRITE_BACKEND)
+            if journal is not None and not journal.resumed:
+                journal.state["engine"] = engine_opts
+                journal.state["autotune"] = wipe_meta.get("autotune")
+                journal.save()
+            readback = None
+            if verify == 'inline':
+                if journal is not None and not offload:
+                    readback = inline_verifier(device, read_block)
+                else:
+                    self.append_log("Inline verification needs the in-process overwrite engine; "
+                                    "verifying after the wipe instead.")
+                    verify = 'full'
+
+            if fallback:
+                success, status = random_overwrite(device, len(fallback), logf=logf,
+                                                   cancel_flag=self.cancel_flag,
+                                                   progress=self.progress_reporter(logf),
+                                                   journal=journal, readback=readback,
+                                                   **engine_opts)
+            elif offload:
+                success, status, wipe_meta["offload"] = offload_zero(
+                    device, logf=logf, cancel_flag=self.cancel_flag,
+                    progress=self.progress_reporter(logf, "Cleared"), discard=ZERO_DISCARD,
+                    journal=journal, **engine_opts)
+                wipe_meta["clear_tier"] = wipe_meta["offload"].get("tier")
+                wipe_meta["discard_tier"] = wipe_meta["offload"].get("discard")
+                self.append_log(f"Clear tier: {wipe_meta['clear_tier']}"
+                                + (f" after {wipe_meta['discard_tier']}" if wipe_meta["discard_tier"] else "")
+                                + f" {wipe_meta['offload']['bytes']}")
+            elif method in ('zero', 'random') and OVERWRITE_BACKEND == 'direct':
+                success, status = direct_overwrite(device, method, logf=logf,
+                                                   cancel_flag=self.cancel_flag,
+                                                   progress=self.progress_reporter(logf),
+                                                   journal=journal, readback=readback,
+                                                   **engine_opts)
+            elif method=='zero':
                 cmd = dd_zero_cmd(device)
                 self.current_process = subprocess.Popen(cmd,shell=True,stdout=subprocess.PIPE,stderr=subprocess.STDOUT,text=True)
                 for line in self.current_process.stdout:
@@ -855,6 +1369,12 @@ class WipeApp:
                 self.current_process.wait()
                 success = (self.current_process.returncode==0) and not self.cancel_flag.is_set()
                 status = 'dd_random_ok' if success else 'dd_random_failed'
+            elif method=='shred' and OVERWRITE_BACKEND == 'direct':
+                success, status = shred_overwrite(device, logf=logf,
+                                                  cancel_flag=self.cancel_flag,
+                                                  progress=self.progress_reporter(logf),
+                                                  journal=journal, readback=readback,
+                                                  **engine_opts)
             elif method=='shred':
                 cmd = shred_zero_cmd(device)
                 self.current_process = subprocess.Popen(cmd,shell=True,stdout=subprocess.PIPE,stderr=subprocess.STDOUT,text=True)
@@ -871,6 +1391,21 @@ class WipeApp:
                 status = "cancelled_by_user"
                 success = False
 
+            # What the last pass left on the device: zeros, or a keystream the
+            # verifier regenerates from the seed kept in the journal
+            expected = None
+            if journal is not None:
+                last = journal.pattern_state(len(journal.state["schedule"]) - 1)
+                if last:
+                    expected = restore_pattern(last)
+                    wipe_meta["verify_pattern"] = last
+            if journal is not None:
+                wipe_meta["journal"] = journal.summary()
+                if success:
+                    journal.complete()
+                else:
+                    self.append_log(f"Progress journal kept at {journal.path}; tick 'Resume' to continue.")
+
             if success:
                 self.append_log("Wipe process completed successfully.")
                 self.append_log(f"Starting verification: {verify}...")
@@ -879,9 +1414,24 @@ class WipeApp:
                     verified_clean=False
                     self.append_log("Verification skipped.")
                 elif verify=='sampled':
-                    verified_clean = verify_sampled(device,logf)
+                    verified_clean = verify_sampled(device,logf,report=wipe_meta,
+                                                    cancel_flag=self.cancel_flag,pattern=expected)
                 elif verify=='full':
-                    verified_clean = verify_full(device,logf)
+                    verified_clean = verify_full(device,logf,read_block,read_depth,self.cancel_flag,
+                                                 wipe_meta,expected,
+                                                 os.path.splitext(logf.name)[0] + ".merkle.json")
+                elif verify=='inline':
+                    verified_clean = verify_inline(device,logf,readback,read_block,self.cancel_flag,
+                                                   wipe_meta,expected)
+                if (verify in ('full', 'inline') and not verified_clean and REMEDIATE
+                        and not self.cancel_flag.is_set()
+                        and wipe_meta.get("dirty_map", {}).get("range_count")):
+                    self.append_log(f"Verification FAILED on {wipe_meta['dirty_map']['range_count']} "
+                                    f"range(s); rewriting only those ranges...")
+                    wipe_meta["remediation"] = remediate(device, logf, wipe_meta["dirty_map"],
+                                                         expected, engine_opts["block_size"],
+                                                         self.cancel_flag, wipe_meta.get("merkle"))
+                    verified_clean = wipe_meta["remediation"]["verified_clean"]
 
                 if verify != 'none':
                     self.append_log(f"Verification result: {'PASSED' if verified_clean else 'FAILED'}")
@@ -894,9 +1444,10 @@ class WipeApp:
                 "system_metadata": sysmeta,
                 "device_metadata": devmeta,
                 "verification_method": verify,
+                "wipe_metadata": wipe_meta,
                 "execution_metadata": {
                     "version": VERSION,
-                    "script_hash": script_sha256()
+                    "script_hash": found["script_sha256"]
                 }
             }
             cert_path = write_certificate(device,method,logf.name,status,verified_clean,extra)
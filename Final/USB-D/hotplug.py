@@ -0,0 +1,216 @@
+import os
+import queue
+import select
+import socket
+import threading
+import time
+from collections import deque
+
+# Live device table driven by kernel uevents. A HotplugService reads add /
+# remove / change events from a NETLINK_KOBJECT_UEVENT socket (or any object
+# with recv(timeout), so tests can feed events by hand), applies them to an
+# Inventory one device at a time and lets callers wait for a specific event
+# instead of sleeping or polling /dev.
+NETLINK_KOBJECT_UEVENT = 15
+UEVENT_GROUP_KERNEL = 1     # kernel broadcasts; udev re-broadcasts on group 2
+UEVENT_BUFFER = 1024**2     # socket receive buffer: bursts while a hub enumerates
+EVENT_HISTORY = 256         # recent events kept for wait_for(since=...)
+FASTBOOT_INTERFACE = "255/66/3"  # USB class/subclass/protocol of the fastboot interface
+FASTBOOT_POLL = 2           # seconds between fastboot checks while waiting for its uevent
+
+
+def parse_uevent(data):
+    """Event dict from a kernel uevent datagram ('action@devpath\\0KEY=VALUE\\0...')"""
+    fields = data.split(b"\0")
+    if b"@" not in fields[0]:
+        return None  # udev's binary 'libudev' format, not a kernel message
+    event = {}
+    for field in fields[1:]:
+        key, sep, value = field.partition(b"=")
+        if sep:
+            event[key.decode("ascii", "replace")] = value.decode("utf-8", "replace")
+    if "ACTION" not in event:
+        event["ACTION"] = fields[0].split(b"@", 1)[0].decode("ascii", "replace")
+    return event
+
+
+class NetlinkSource:
+    """Kernel uevent socket. recv(timeout) returns an event dict or None."""
+
+    def __init__(self):
+        self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM | socket.SOCK_CLOEXEC,
+                                  NETLINK_KOBJECT_UEVENT)
+        try:
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, UEVENT_BUFFER)
+            self.sock.bind((0, UEVENT_GROUP_KERNEL))
+        except OSError:
+            self.sock.close()
+            raise
+
+    def recv(self, timeout=None):
+        if not select.select([self.sock], [], [], timeout)[0]:
+            return None
+        return parse_uevent(self.sock.recv(65536))
+
+    def close(self):
+        self.sock.close()
+
+
+class QueueSource:
+    """Hand-fed event source (tests, replays): put() events, the service recv()s them"""
+
+    def __init__(self):
+        self.events = queue.Queue()
+
+    def put(self, event):
+        self.events.put(event)
+
+    def recv(self, timeout=None):
+        try:
+            return self.events.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        pass
+
+
+# - Event predicates for HotplugService.wait_for -
+def block_name(event):
+    return os.path.basename(event.get("DEVNAME") or event.get("DEVPATH", ""))
+
+
+def parent_disk(event):
+    """Whole-disk name of a block event (itself for disks, the parent for partitions)"""
+    if event.get("DEVTYPE") == "partition":
+        return os.path.basename(os.path.dirname(event.get("DEVPATH", "")))
+    return block_name(event)
+
+
+def partition_added(device, number=None):
+    """Partition `number` (any when None) of device appeared, e.g. sdb1"""
+    disk = os.path.basename(device)
+    return lambda ev: (ev.get("SUBSYSTEM") == "block" and ev.get("ACTION") == "add"
+                       and ev.get("DEVTYPE") == "partition" and parent_disk(ev) == disk
+                       and (number is None or ev.get("PARTN") == str(number)))
+
+
+def touches_device(device):
+    """Any block event on device or one of its partitions"""
+    disk = os.path.basename(device)
+    return lambda ev: ev.get("SUBSYSTEM") == "block" and parent_disk(ev) == disk
+
+
+def fastboot_added(ev):
+    return (ev.get("SUBSYSTEM") == "usb" and ev.get("ACTION") in ("add", "bind")
+            and ev.get("INTERFACE") == FASTBOOT_INTERFACE)
+
+
+class HotplugService:
+    """Applies uevents to inventory as they arrive and wakes up waiters.
+    listeners are called (from the service thread) with every event applied."""
+
+    def __init__(self, inventory, source=None):
+        self.inventory = inventory
+        self.source = source
+        self.listeners = []
+        self._history = deque(maxlen=EVENT_HISTORY)
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.source is None:
+            self.source = NetlinkSource()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.source.close()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                event = self.source.recv(0.5)
+            except OSError:
+                # ENOBUFS: events were dropped, the cached table may be stale
+                self.inventory.invalidate()
+                continue
+            if event:
+                self.apply(event)
+
+    def apply(self, event):
+        """Update the inventory for one event, then record it and notify"""
+        if event.get("SUBSYSTEM") == "block":
+            disk = parent_disk(event)
+            if event.get("DEVTYPE") != "partition" and event.get("ACTION") == "remove":
+                self.inventory.remove(disk)
+            elif disk:
+                self.inventory.reload(disk)
+        with self._cond:
+            self._seq += 1
+            self._history.append((self._seq, event))
+            self._cond.notify_all()
+        for listener in list(self.listeners):
+            try:
+                listener(event)
+            except Exception:
+                pass
+
+    def mark(self):
+        """Sequence number to pass as wait_for(since=...) for events that may
+        arrive before the wait starts (take it before triggering the change)"""
+        with self._cond:
+            return self._seq
+
+    def wait_for(self, predicate, timeout=None, since=None):
+        """First event after `since` (default: now) matching predicate, or None on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            seen = self._seq if since is None else since
+            while True:
+                for seq, event in self._history:
+                    if seq > seen and predicate(event):
+                        return event
+                seen = self._seq
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+    def settle(self, predicate, quiet=0.2, timeout=2.0):
+        """Wait until no event matching predicate has arrived for `quiet`
+        seconds (at most timeout). Returns True when settled."""
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            if self.wait_for(predicate, min(quiet, remaining)) is None:
+                return remaining >= quiet
+
+
+def wait_for_fastboot(poll, timeout, service=None, since=None):
+    """poll() -> `fastboot devices` output; returns the first non-empty one, or
+    None after timeout. With a HotplugService the wait sleeps on the fastboot
+    interface's uevent (after `since`) instead of polling once a second, but
+    still polls every FASTBOOT_POLL seconds in case the event never comes."""
+    deadline = time.monotonic() + timeout
+    while True:
+        out = poll()
+        if out and out.strip():
+            return out.strip()
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        if service is not None:
+            # once the interface is up, poll briefly until fastboot lists it
+            if service.wait_for(fastboot_added, min(remaining, FASTBOOT_POLL), since) is not None:
+                service = None
+        else:
+            time.sleep(min(1, remaining))
@@ -0,0 +1,303 @@
+import os
+import re
+import json
+import subprocess
+import threading
+
+# Device inventory, read either from sysfs directly (no subprocess) or from a
+# single `lsblk --json -b -O` call. Records are cached until the next
+# refresh() or invalidate() (hotplug), so listing devices and classifying the
+# selected one no longer fork a process per device.
+LSBLK_CMD = ["lsblk", "--json", "-b", "-O"]
+LSBLK_TIMEOUT = 15
+BACKENDS = ("sysfs", "lsblk")
+HIDDEN_TYPES = ("loop", "rom")  # not offered as wipe targets
+TRANSPORTS = {"nvme": "nvme", "usb": "usb", "sata": "ata", "ata": "ata"}
+# sysfs device path component -> lsblk-style transport name
+SYSFS_TRANSPORTS = (("nvme", "nvme"), ("usb", "usb"), ("ata", "sata"), ("mmc", "mmc"),
+                    ("virtio", "virtio"))
+SECTOR = 512  # /sys/block/<dev>/size is always in 512-byte units
+
+
+def _flag(value):
+    # lsblk < 2.33 prints booleans as "0"/"1" strings
+    return value in (True, 1, "1")
+
+
+def _int(value, default=0):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _text(value):
+    value = (value or "").strip()
+    return value or None
+
+
+def _mounts(entry):
+    # lsblk >= 2.37 lists every mountpoint, older versions only one
+    return [m for m in (entry.get("mountpoints") or [entry.get("mountpoint")]) if m]
+
+
+def human_size(nbytes):
+    """lsblk-style size: 931.5G, 59.6G, 512M"""
+    size = float(nbytes)
+    for unit in ("B", "K", "M", "G", "T", "P"):
+        if size < 1024 or unit == "P":
+            break
+        size /= 1024
+    return f"{size:.0f}{unit}" if unit == "B" or size >= 100 else f"{size:.1f}{unit}"
+
+
+class Device:
+    """One whole disk: identity, geometry and what sits on top of it"""
+
+    def __init__(self, path, name, type="disk", size=0, model=None, serial=None, wwn=None,
+                 vendor=None, transport=None, rotational=None, removable=False,
+                 logical_block_size=512, physical_block_size=512, partitions=(), holders=(),
+                 mountpoints=()):
+        self.path = path
+        self.name = name
+        self.type = type
+        self.size = size
+        self.model = model
+        self.serial = serial
+        self.wwn = wwn
+        self.vendor = vendor
+        self.transport = transport
+        self.rotational = rotational
+        self.removable = removable
+        self.logical_block_size = logical_block_size
+        self.physical_block_size = physical_block_size
+        self.partitions = list(partitions)
+        self.holders = list(holders)
+        self.mountpoints = list(mountpoints)
+        self.interface = None  # filled in (and cached) by driver.detect_device_type
+
+    @classmethod
+    def from_lsblk(cls, entry):
+        partitions, holders, mountpoints = [], [], []
+
+        def walk(node):
+            for child in node.get("children") or ():
+                path = child.get("path") or f"/dev/{child.get('name')}"
+                (partitions if child.get("type") == "part" else holders).append(path)
+                mountpoints.extend(_mounts(child))
+                walk(child)
+
+        walk(entry)
+        mountpoints[:0] = _mounts(entry)
+        name = entry.get("name") or entry.get("kname")
+        return cls(
+            path=entry.get("path") or f"/dev/{name}",
+            name=name,
+            type=entry.get("type") or "disk",
+            size=_int(entry.get("size")),
+            model=_text(entry.get("model")),
+            serial=_text(entry.get("serial")),
+            wwn=_text(entry.get("wwn")),
+            vendor=_text(entry.get("vendor")),
+            transport=_text(entry.get("tran")),
+            rotational=_flag(entry.get("rota")) if entry.get("rota") is not None else None,
+            removable=_flag(entry.get("rm")),
+            logical_block_size=_int(entry.get("log-sec"), 512),
+            physical_block_size=_int(entry.get("phy-sec"), 512),
+            partitions=partitions,
+            holders=holders,
+            mountpoints=mountpoints,
+        )
+
+    def interface_hint(self):
+        """'nvme' / 'usb' / 'ata' from the name or transport, None when unknown"""
+        if self.name.startswith("nvme"):
+            return "nvme"
+        return TRANSPORTS.get((self.transport or "").lower())
+
+    def label(self):
+        return " ".join(p for p in (human_size(self.size), self.model) if p)
+
+    def as_dict(self):
+        return {k: v for k, v in vars(self).items() if k != "interface"}
+
+
+def parse_lsblk(text):
+    """Device records for the top-level entries of `lsblk --json` output"""
+    return [Device.from_lsblk(e) for e in json.loads(text).get("blockdevices", [])]
+
+
+# - sysfs backend -
+def _read(path):
+    try:
+        with open(path, "rb") as f:
+            return f.read().decode("utf-8", "replace").strip() or None
+    except OSError:
+        return None
+
+
+def _listdir(path):
+    try:
+        return sorted(os.listdir(path))
+    except OSError:
+        return []
+
+
+def _vpd_serial(path):
+    # SCSI VPD page 0x80: 4-byte header, then the unit serial number
+    try:
+        with open(path, "rb") as f:
+            page = f.read()
+    except OSError:
+        return None
+    return _text(page[4:4 + page[3]].decode("ascii", "replace")) if len(page) > 4 else None
+
+
+def _sysfs_transport(sysdir):
+    parts = os.path.realpath(sysdir).split(os.sep)
+    for key, tran in SYSFS_TRANSPORTS:
+        if any(p.startswith(key) for p in parts):
+            return tran
+    return None
+
+
+def _sysfs_mounts(root):
+    mounts = {}
+    text = _read(os.path.join(root, "proc/self/mounts")) or ""
+    for line in text.splitlines():
+        fields = line.split()
+        if len(fields) >= 2 and fields[0].startswith("/dev/"):
+            mounts.setdefault(os.path.basename(fields[0]), []).append(fields[1])
+    return mounts
+
+
+def read_sysfs_device(root, name, mounts=None):
+    """Device record for /sys/block/<name> under root"""
+    base = os.path.join(root, "sys/block", name)
+    dev = os.path.join(base, "device")
+    partitions = [p for p in _listdir(base) if os.path.exists(os.path.join(base, p, "partition"))]
+    holders = []
+    for sub in [base] + [os.path.join(base, p) for p in partitions]:
+        holders += [h for h in _listdir(os.path.join(sub, "holders")) if h not in holders]
+    model = _read(os.path.join(dev, "model"))
+    serial = _read(os.path.join(base, "serial")) or _read(os.path.join(dev, "serial"))
+    ctrl = re.match(r"nvme\d+", name)
+    if ctrl:
+        cdir = os.path.join(root, "sys/class/nvme", ctrl.group(0))
+        model = model or _read(os.path.join(cdir, "model"))
+        serial = serial or _read(os.path.join(cdir, "serial"))
+    serial = serial or _vpd_serial(os.path.join(dev, "vpd_pg80"))
+    mounts = mounts or {}
+    names = [name] + partitions + holders
+    # device-mapper holders are mounted by their /dev/mapper name
+    names += [_read(os.path.join(root, "sys/block", h, "dm/name")) or h for h in holders]
+    rotational = _read(os.path.join(base, "queue/rotational"))
+    return Device(
+        path=f"/dev/{name}",
+        name=name,
+        type="loop" if name.startswith("loop") else "rom" if name.startswith("sr") else "disk",
+        size=_int(_read(os.path.join(base, "size"))) * SECTOR,
+        model=model,
+        serial=serial,
+        wwn=_read(os.path.join(base, "wwid")) or _read(os.path.join(dev, "wwid")),
+        vendor=_read(os.path.join(dev, "vendor")),
+        transport=_sysfs_transport(base),
+        rotational=rotational == "1" if rotational is not None else None,
+        removable=_read(os.path.join(base, "removable")) == "1",
+        logical_block_size=_int(_read(os.path.join(base, "queue/logical_block_size")), 512),
+        physical_block_size=_int(_read(os.path.join(base, "queue/physical_block_size")), 512),
+        partitions=[f"/dev/{p}" for p in partitions],
+        holders=[f"/dev/{h}" for h in holders],
+        mountpoints=[m for n in names for m in mounts.get(n, [])],
+    )
+
+
+def read_sysfs(root="/"):
+    """Device records straight from <root>/sys/block and <root>/sys/class/nvme.
+    Stacked devices (dm, md: anything with slaves) are reported as holders of
+    their disks rather than as disks of their own."""
+    mounts = _sysfs_mounts(root)
+    block = os.path.join(root, "sys/block")
+    return [read_sysfs_device(root, name, mounts) for name in _listdir(block)
+            if not _listdir(os.path.join(block, name, "slaves"))]
+
+
+class Inventory:
+    """Cached device table. refresh() reads sysfs (backend 'sysfs', rooted at
+    sysfs_root) or runs lsblk once (backend 'lsblk'); lookups between refreshes
+    are served from memory. runner(cmd) -> stdout can be swapped for tests."""
+
+    def __init__(self, backend="sysfs", sysfs_root="/", runner=None):
+        if backend not in BACKENDS:
+            raise ValueError(f"unknown inventory backend: {backend}")
+        self.backend = backend
+        self.sysfs_root = sysfs_root
+        self.runner = runner or (lambda cmd: subprocess.run(
+            cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+            check=True, timeout=LSBLK_TIMEOUT).stdout)
+        self.error = None
+        self._devices = None
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        try:
+            if self.backend == "sysfs":
+                devices = read_sysfs(self.sysfs_root)
+            else:
+                devices = parse_lsblk(self.runner(LSBLK_CMD))
+            self.error = None
+        except (OSError, ValueError, subprocess.SubprocessError) as e:
+            devices = []
+            self.error = str(e)
+        with self._lock:
+            self._devices = {d.path: d for d in devices}
+        return [d for d in devices if d.type not in HIDDEN_TYPES]
+
+    def reload(self, name):
+        """Re-read one whole disk (hotplug add/change) into a loaded table.
+        Returns its record, or None when it is gone (and drops it)."""
+        dev = None
+        try:
+            if self.backend == "sysfs":
+                if os.path.isdir(os.path.join(self.sysfs_root, "sys/block", name)):
+                    dev = read_sysfs_device(self.sysfs_root, name, _sysfs_mounts(self.sysfs_root))
+            else:
+                found = parse_lsblk(self.runner(LSBLK_CMD + [f"/dev/{name}"]))
+                dev = found[0] if found else None
+        except (OSError, ValueError, subprocess.SubprocessError):
+            pass
+        with self._lock:
+            if self._devices is not None:
+                if dev is not None:
+                    self._devices[dev.path] = dev
+                else:
+                    self._devices.pop(f"/dev/{name}", None)
+        return dev
+
+    def remove(self, name):
+        with self._lock:
+            if self._devices is not None:
+                self._devices.pop(f"/dev/{name}", None)
+
+    def invalidate(self):
+        """Drop the cached table (e.g. on hotplug); the next lookup reloads it"""
+        with self._lock:
+            self._devices = None
+
+    def _table(self):
+        with self._lock:
+            table = self._devices
+        if table is None:
+            self.refresh()
+            with self._lock:
+                table = self._devices
+        return table or {}
+
+    def devices(self, hidden=False):
+        """Whole disks, without loop devices and optical drives unless hidden"""
+        return [d for d in self._table().values() if hidden or d.type not in HIDDEN_TYPES]
+
+    def get(self, path):
+        """Record for a whole-disk path (symlinks resolved), or None"""
+        table = self._table()
+        return table.get(path) or table.get(os.path.realpath(path))
@@ -0,0 +1,160 @@
+import os
+import re
+import json
+from datetime import datetime
+
+# Per-device checkpoint journal so an interrupted wipe can resume from the
+# last durably flushed offset instead of byte 0.
+JOURNAL_VERSION = 1
+
+
+def device_identity(devmeta):
+    """Fields that must match before a journal may be resumed on a device"""
+    return {k: devmeta.get(k) for k in ("serial", "wwn", "model", "capacity_bytes")}
+
+
+def resumable(identity, size):
+    """Only a drive that can be told apart from others may resume: it needs a
+    serial or WWN, and the recorded capacity must equal its current size"""
+    if not (identity.get("serial") or identity.get("wwn")):
+        return False
+    try:
+        return size is not None and int(identity.get("capacity_bytes")) == size
+    except (TypeError, ValueError):
+        return False
+
+
+def journal_path(log_dir, devmeta):
+    key = devmeta.get("wwn") or devmeta.get("serial") or os.path.basename(devmeta["device"])
+    key = re.sub(r"[^A-Za-z0-9_.-]", "_", str(key))
+    return os.path.join(log_dir, f"journal_{key}.json")
+
+
+def atomic_write_json(path, obj):
+    """Write to a temp file, fsync, rename over path, fsync the directory"""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(obj, f, indent=4)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    dfd = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+    try:
+        os.fsync(dfd)
+    finally:
+        os.close(dfd)
+
+
+class WipeJournal:
+    def __init__(self, path, state, resumed=False):
+        self.path = path
+        self.state = state
+        self.resumed = resumed
+
+    @classmethod
+    def open(cls, path, devmeta, method, schedule, engine, log_file, resume=False, logf=None,
+             size=None):
+        """Load a matching journal when resume is set, otherwise start a fresh one.
+        size is the device's current size in bytes (see resumable)."""
+        identity = device_identity(devmeta)
+        state = None
+        if resume and not resumable(identity, size):
+            if logf: logf.write("Device has no serial/WWN or its size does not match, "
+                                "not resuming.\n")
+        elif resume and os.path.exists(path):
+            try:
+                with open(path) as f:
+                    state = json.load(f)
+            except (OSError, ValueError) as e:
+                if logf: logf.write(f"Journal {path} unreadable ({e}), starting over.\n")
+            if state and (state.get("identity") != identity or state.get("method") != method
+                          or state.get("schedule") != schedule):
+                if logf: logf.write("Journal does not match this device/method, starting over.\n")
+                state = None
+        resumed = state is not None
+        if state is None:
+            state = {
+                "version": JOURNAL_VERSION,
+                "device": devmeta.get("device"),
+                "identity": identity,
+                "method": method,
+                "schedule": schedule,
+                "engine": engine,
+                "pass": 0,
+                "offset": 0,
+                "created": datetime.now().isoformat(),
+                "sessions": [],
+                "segments": [],
+            }
+        state["sessions"].append({
+            "started": datetime.now().isoformat(),
+            "log_file": log_file,
+            "resumed_at": {"pass": state["pass"], "offset": state["offset"]} if resumed else None,
+        })
+        journal = cls(path, state, resumed)
+        journal.save()
+        return journal
+
+    @property
+    def pass_index(self):
+        return self.state["pass"]
+
+    @property
+    def offset(self):
+        return self.state["offset"]
+
+    def start_for(self, index):
+        """Offset to start pass `index` at, or None when it is already done"""
+        if index < self.pass_index:
+            return None
+        return self.offset if index == self.pass_index else 0
+
+    def begin_pass(self, index, start):
+        self.state["pass"] = index
+        self.state["offset"] = start
+        self.state["segments"].append({
+            "session": len(self.state["sessions"]),
+            "pass": index,
+            "pattern": self.state["schedule"][index],
+            "start": start,
+            "end": start,
+        })
+        self.save()
+
+    def checkpoint(self, index, offset):
+        """Record that pass `index` is durable up to offset"""
+        self.state["pass"] = index
+        self.state["offset"] = offset
+        self.state["segments"][-1]["end"] = offset
+        self.state["updated"] = datetime.now().isoformat()
+        self.save()
+
+    def pattern_state(self, index):
+        """Pattern (with keystream seed) recorded for pass index, or None"""
+        return self.state.setdefault("patterns", {}).get(str(index))
+
+    def set_pattern(self, index, state):
+        self.state.setdefault("patterns", {})[str(index)] = state
+        self.save()
+
+    def end_pass(self, index):
+        self.state["pass"] = index + 1
+        self.state["offset"] = 0
+        self.save()
+
+    def save(self):
+        atomic_write_json(self.path, self.state)
+
+    def complete(self):
+        """Wipe finished: the certificate now carries the history"""
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def summary(self):
+        return {
+            "resumed": self.resumed,
+            "sessions": self.state["sessions"],
+            "segments": self.state["segments"],
+        }
@@ -0,0 +1,215 @@
+import os
+import ctypes
+import errno
+import platform
+import time
+
+from wipe_engine import BufferPool, Cancelled, PROGRESS_INTERVAL, AIO_QUEUE_DEPTH
+
+# Native Linux AIO (io_setup/io_submit/io_getevents) through ctypes.
+# Only truly asynchronous on O_DIRECT file descriptors.
+
+_SYSCALLS = {
+    "x86_64": {"io_setup": 206, "io_destroy": 207, "io_getevents": 208, "io_submit": 209},
+    "aarch64": {"io_setup": 0, "io_destroy": 1, "io_submit": 2, "io_getevents": 4},
+}
+
+IOCB_CMD_PREAD = 0
+IOCB_CMD_PWRITE = 1
+
+
+class IOCB(ctypes.Structure):
+    # <linux/aio_abi.h>, little-endian field order
+    _fields_ = [
+        ("aio_data", ctypes.c_uint64),
+        ("aio_key", ctypes.c_uint32),
+        ("aio_rw_flags", ctypes.c_int32),
+        ("aio_lio_opcode", ctypes.c_uint16),
+        ("aio_reqprio", ctypes.c_int16),
+        ("aio_fildes", ctypes.c_uint32),
+        ("aio_buf", ctypes.c_uint64),
+        ("aio_nbytes", ctypes.c_uint64),
+        ("aio_offset", ctypes.c_int64),
+        ("aio_reserved2", ctypes.c_uint64),
+        ("aio_flags", ctypes.c_uint32),
+        ("aio_resfd", ctypes.c_uint32),
+    ]
+
+
+class IOEvent(ctypes.Structure):
+    _fields_ = [
+        ("data", ctypes.c_uint64),
+        ("obj", ctypes.c_uint64),
+        ("res", ctypes.c_int64),
+        ("res2", ctypes.c_int64),
+    ]
+
+
+class Timespec(ctypes.Structure):
+    _fields_ = [("tv_sec", ctypes.c_long), ("tv_nsec", ctypes.c_long)]
+
+
+_libc = None
+
+
+def _syscall(name, *args):
+    global _libc
+    nums = _SYSCALLS.get(platform.machine())
+    if nums is None:
+        raise OSError(errno.ENOSYS, f"Linux AIO not wired for {platform.machine()}")
+    if _libc is None:
+        _libc = ctypes.CDLL(None, use_errno=True)
+        _libc.syscall.restype = ctypes.c_long
+    res = _libc.syscall(ctypes.c_long(nums[name]), *args)
+    if res < 0:
+        err = ctypes.get_errno()
+        raise OSError(err, f"{name}: {os.strerror(err)}")
+    return res
+
+
+class AioContext:
+    def __init__(self, depth):
+        self.depth = depth
+        self.ctx = ctypes.c_ulong(0)
+        self.events = (IOEvent * depth)()
+        self.syscalls = 0
+        _syscall("io_setup", ctypes.c_uint(depth), ctypes.byref(self.ctx))
+
+    def submit(self, iocbs):
+        """Submit all iocbs (io_submit may accept fewer than asked)"""
+        arr = (ctypes.POINTER(IOCB) * len(iocbs))(*[ctypes.pointer(c) for c in iocbs])
+        done = 0
+        while done < len(iocbs):
+            self.syscalls += 1
+            ptr = ctypes.cast(ctypes.byref(arr, done * ctypes.sizeof(ctypes.c_void_p)),
+                              ctypes.POINTER(ctypes.POINTER(IOCB)))
+            done += _syscall("io_submit", self.ctx, ctypes.c_long(len(iocbs) - done), ptr)
+
+    def getevents(self, min_nr, timeout=None):
+        ts = None
+        if timeout is not None:
+            ts = ctypes.byref(Timespec(int(timeout), int((timeout % 1) * 1e9)))
+        self.syscalls += 1
+        try:
+            n = _syscall("io_getevents", self.ctx, ctypes.c_long(min_nr),
+                         ctypes.c_long(self.depth), self.events, ts)
+        except OSError as e:
+            if e.errno == errno.EINTR:
+                return []
+            raise
+        return self.events[:n]
+
+    def close(self):
+        # io_destroy waits for anything still in flight
+        if self.ctx.value:
+            _syscall("io_destroy", self.ctx)
+            self.ctx.value = 0
+
+
+def aio_available():
+    try:
+        AioContext(1).close()
+        return True
+    except (OSError, AttributeError):
+        return False
+
+
+class AioStats:
+    def __init__(self, depth):
+        self.depth = depth
+        self.ops = 0
+        self.syscalls = 0
+        self.bytes = 0
+        self.elapsed = 0.0
+        self.stopped = False  # a read consumer asked to stop early
+
+    def merge(self, other):
+        """Fold in a later segment of the same pass"""
+        self.ops += other.ops
+        self.syscalls += other.syscalls
+        self.bytes += other.bytes
+        self.elapsed += other.elapsed
+        return self
+
+    def summary(self):
+        rate = self.bytes / self.elapsed / (1024**2) if self.elapsed > 0 else 0
+        return (f"linux-aio: queue depth {self.depth}, {self.ops} I/Os in {self.syscalls} "
+                f"syscalls, {rate:.1f} MiB/s")
+
+
+def _run(fd, start, end, opcode, block_size, depth, prepare, complete,
+         cancel_flag=None, progress=None, pool=None):
+    """Keep up to `depth` aligned I/Os of block_size in flight over [start, end).
+    prepare(view, offset) fills a buffer before a write; complete(view, offset)
+    consumes a finished read (completion order is not offset order) and may
+    return False to stop early."""
+    stats = AioStats(depth)
+    ctx = AioContext(depth)
+    bufs = (pool or BufferPool(block_size)).take(depth)
+    views = [memoryview(b) for b in bufs]
+    addrs = [ctypes.addressof(ctypes.c_char.from_buffer(b)) for b in bufs]
+    iocbs = (IOCB * depth)()
+    free = list(range(depth))
+    pos = start
+    total = end - start
+    started = last_report = time.monotonic()
+    try:
+        while stats.bytes < total and not stats.stopped:
+            if cancel_flag is not None and cancel_flag.is_set():
+                raise Cancelled()
+            batch = []
+            while free and pos < end:
+                i = free.pop()
+                n = min(block_size, end - pos)
+                if prepare:
+                    prepare(views[i][:n], pos)
+                cb = iocbs[i]
+                ctypes.memset(ctypes.byref(cb), 0, ctypes.sizeof(IOCB))
+                cb.aio_data = i
+                cb.aio_lio_opcode = opcode
+                cb.aio_fildes = fd
+                cb.aio_buf = addrs[i]
+                cb.aio_nbytes = n
+                cb.aio_offset = pos
+                batch.append(cb)
+                pos += n
+            if batch:
+                ctx.submit(batch)
+                stats.ops += len(batch)
+            # Reap in batches of half the ring so each refill is one io_submit
+            inflight = depth - len(free)
+            for ev in ctx.getevents(min(inflight, max(1, depth // 2)), timeout=0.1):
+                i = ev.data
+                cb = iocbs[i]
+                if ev.res < 0:
+                    raise OSError(-ev.res, f"aio at offset {cb.aio_offset}: {os.strerror(-ev.res)}")
+                if ev.res != cb.aio_nbytes:
+                    raise OSError(errno.EIO, f"short aio transfer at offset {cb.aio_offset}")
+                if complete and complete(views[i][:ev.res], cb.aio_offset) is False:
+                    stats.stopped = True
+                stats.bytes += ev.res
+                free.append(i)
+            now = time.monotonic()
+            if progress and now - last_report >= PROGRESS_INTERVAL:
+                progress(stats.bytes, total, now - started)
+                last_report = now
+    finally:
+        ctx.close()
+        stats.syscalls = ctx.syscalls
+        stats.elapsed = time.monotonic() - started
+    return stats
+
+
+def aio_write(fd, start, end, pattern, block_size, depth=AIO_QUEUE_DEPTH,
+              cancel_flag=None, progress=None, pool=None, readback=None):
+    complete = None
+    if readback:
+        complete = lambda view, offset: readback.wrote(offset, len(view))
+    return _run(fd, start, end, IOCB_CMD_PWRITE, block_size, depth,
+                pattern.fill, complete, cancel_flag, progress, pool)
+
+
+def aio_read(fd, start, end, block_size, consume, depth=AIO_QUEUE_DEPTH,
+             cancel_flag=None, progress=None, pool=None):
+    return _run(fd, start, end, IOCB_CMD_PREAD, block_size, depth,
+                None, consume, cancel_flag, progress, pool)
@@ -0,0 +1,209 @@
+import os
+import json
+import random
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from journal import atomic_write_json
+from verify import open_verify, pread_full, aligned_read_len, VERIFY_BLOCK
+from wipe_engine import aligned_buffer
+
+# Merkle digest of the post-wipe device: one leaf per fixed-size region, so a
+# later audit can re-hash a handful of regions instead of the whole device.
+MERKLE_REGION = 64 * 1024**2
+MERKLE_HASH = "sha256"
+REVERIFY_SAMPLES = 8
+LEAF_PREFIX = b"\x00"  # leaf = H(0x00 || region bytes)
+NODE_PREFIX = b"\x01"  # node = H(0x01 || left || right)
+
+
+def merkle_root(leaves, algorithm=MERKLE_HASH):
+    """Root over leaf digests; an odd node at the end of a level is promoted unchanged"""
+    level = list(leaves)
+    if not level:
+        return hashlib.new(algorithm, NODE_PREFIX).digest()
+    while len(level) > 1:
+        nxt = [hashlib.new(algorithm, NODE_PREFIX + level[i] + level[i + 1]).digest()
+               for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            nxt.append(level[-1])
+        level = nxt
+    return level[0]
+
+
+class MerkleTree:
+    def __init__(self, size, region_size, leaves, algorithm=MERKLE_HASH):
+        self.size = size
+        self.region_size = region_size
+        self.leaves = leaves
+        self.algorithm = algorithm
+        self.root = merkle_root(leaves, algorithm)
+
+    def region(self, index):
+        start = index * self.region_size
+        return start, min(self.size, start + self.region_size)
+
+    def regions_for(self, ranges):
+        """Leaf indices touched by [start, end) ranges"""
+        hit = set()
+        for start, end in ranges:
+            hit.update(range(start // self.region_size, -(-end // self.region_size)))
+        return sorted(i for i in hit if i < len(self.leaves))
+
+    def as_dict(self):
+        return {
+            "algorithm": self.algorithm,
+            "region_size": self.region_size,
+            "regions": len(self.leaves),
+            "device_size": self.size,
+            "leaf": "H(0x00 || region)",
+            "node": "H(0x01 || left || right), odd node promoted",
+            "root": self.root.hex(),
+        }
+
+    def save(self, path):
+        """Sidecar with every leaf, for partial re-verification later"""
+        atomic_write_json(path, dict(self.as_dict(), leaves=[l.hex() for l in self.leaves]))
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        tree = cls(data["device_size"], data["region_size"],
+                   [bytes.fromhex(l) for l in data["leaves"]], data["algorithm"])
+        if tree.root.hex() != data["root"]:
+            raise ValueError(f"{path}: leaves do not reproduce the recorded root")
+        return tree
+
+
+class RegionHasher:
+    """Merkle leaves built from the blocks a verification scanner reads anyway.
+    update(view, offset) may be called from several threads and out of offset
+    order (AIO completions); each region is hashed in order, a block that
+    arrives ahead of its region's position being copied and held until the
+    gap is filled. tree() returns the MerkleTree once every byte was seen."""
+
+    def __init__(self, size, region_size=MERKLE_REGION, algorithm=MERKLE_HASH):
+        self.size = size
+        self.region_size = region_size
+        self.algorithm = algorithm
+        count = -(-size // region_size)
+        self._hashes = [None] * count
+        self._next = [i * region_size for i in range(count)]
+        self._pending = [None] * count
+        self._locks = [threading.Lock() for _ in range(count)]
+
+    def update(self, view, offset):
+        view = memoryview(view)[:max(0, self.size - offset)]
+        while len(view):
+            index = offset // self.region_size
+            n = min(len(view), (index + 1) * self.region_size - offset)
+            self._feed(index, view[:n], offset)
+            view, offset = view[n:], offset + n
+
+    def _feed(self, index, view, offset):
+        with self._locks[index]:
+            pos = self._next[index]
+            if offset < pos:  # re-read of bytes already hashed
+                if offset + len(view) <= pos:
+                    return
+                view, offset = view[pos - offset:], pos
+            if offset > pos:
+                if self._pending[index] is None:
+                    self._pending[index] = {}
+                self._pending[index][offset] = bytes(view)
+                return
+            h = self._hashes[index]
+            if h is None:
+                h = self._hashes[index] = hashlib.new(self.algorithm, LEAF_PREFIX)
+            h.update(view)  # hashlib drops the GIL for large buffers
+            pos += len(view)
+            pending = self._pending[index]
+            while pending and pos in pending:
+                data = pending.pop(pos)
+                h.update(data)
+                pos += len(data)
+            self._next[index] = pos
+
+    def tree(self):
+        leaves = []
+        for index, h in enumerate(self._hashes):
+            end = min(self.size, (index + 1) * self.region_size)
+            if h is None or self._next[index] < end:
+                raise ValueError(f"Merkle region {index} was not read completely")
+            leaves.append(h.digest())
+        return MerkleTree(self.size, self.region_size, leaves, self.algorithm)
+
+
+def _hash_regions(device, size, indices, region_size, algorithm, threads, block_size, direct):
+    """Hash the given regions with a pool of readers. Returns {index: digest}."""
+    fd, _, align = open_verify(device, direct)
+    local = threading.local()
+
+    def hash_region(index):
+        if not hasattr(local, "view"):
+            local.view = memoryview(aligned_buffer(block_size))
+        view = local.view
+        h = hashlib.new(algorithm, LEAF_PREFIX)
+        pos = index * region_size
+        end = min(size, pos + region_size)
+        while pos < end:
+            n = min(pread_full(fd, view[:aligned_read_len(end - pos, block_size, align)], pos),
+                    end - pos)
+            if n <= 0:
+                break
+            h.update(view[:n])  # hashlib drops the GIL for large buffers
+            pos += n
+        return index, h.digest()
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, threads)) as pool:
+            return dict(pool.map(hash_region, indices))
+    finally:
+        os.close(fd)
+
+
+def refresh_regions(device, sidecar, ranges, threads=4, block_size=VERIFY_BLOCK, direct=True):
+    """Re-hash the regions covering ranges after they were rewritten, update
+    the sidecar and return (MerkleTree, refreshed region indices)"""
+    tree = MerkleTree.load(sidecar)
+    regions = tree.regions_for(ranges)
+    digests = _hash_regions(device, tree.size, regions, tree.region_size, tree.algorithm,
+                            threads, block_size, direct)
+    leaves = list(tree.leaves)
+    for i in regions:
+        leaves[i] = digests[i]
+    tree = MerkleTree(tree.size, tree.region_size, leaves, tree.algorithm)
+    tree.save(sidecar)
+    return tree, regions
+
+
+def reverify_regions(device, sidecar, regions=None, samples=REVERIFY_SAMPLES, seed=None,
+                     threads=4, block_size=VERIFY_BLOCK, direct=True):
+    """Re-hash a few regions and compare them with the leaves in a sidecar written
+    by MerkleTree.save (whose leaves must reproduce its root). regions picks the
+    indices; otherwise `samples` are drawn from seed. Returns a result dict."""
+    tree = MerkleTree.load(sidecar)
+    fd, _, _ = open_verify(device, direct)
+    try:
+        size = os.lseek(fd, 0, os.SEEK_END)
+    finally:
+        os.close(fd)
+    if size != tree.size:
+        return {"ok": False, "error": f"device size {size} != recorded {tree.size}"}
+    if seed is None:
+        seed = int.from_bytes(os.urandom(8), "little")
+    if regions is None:
+        rng = random.Random(seed)
+        regions = sorted(rng.sample(range(len(tree.leaves)), min(samples, len(tree.leaves))))
+    digests = _hash_regions(device, size, regions, tree.region_size, tree.algorithm, threads,
+                            block_size, direct)
+    mismatched = [i for i in regions if digests[i] != tree.leaves[i]]
+    return {
+        "ok": not mismatched,
+        "root": tree.root.hex(),
+        "seed": seed,
+        "checked": list(regions),
+        "mismatched": mismatched,
+    }
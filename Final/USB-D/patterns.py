@@ -0,0 +1,161 @@
+import os
+import hashlib
+
+# Optional: cryptography gives AES-CTR / ChaCha20 at several GB/s.
+# Without it the random pattern falls back to a (slower) SHAKE-256 keystream.
+try:
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+except ImportError:
+    Cipher = None
+
+_ZERO = b""
+
+
+def zero_buffer(n):
+    """The shared zero bytes object, at least n long"""
+    global _ZERO
+    if len(_ZERO) < n:
+        _ZERO = bytes(n)
+    return _ZERO
+
+
+def zeros(n):
+    """Read-only zero source of length n, sliced from one shared buffer"""
+    return memoryview(zero_buffer(n))[:n]
+
+
+class ZeroPattern:
+    name = "zero"
+
+    def fill(self, view, offset):
+        view[:] = zeros(len(view))
+
+    def describe(self):
+        return {"pattern": self.name}
+
+    def state(self):
+        return self.describe()
+
+
+class FixedPattern:
+    """Repeating byte pattern (e.g. 0x55, 0xAA, 0x924924), phase-locked to the
+    device offset so any chunk can be filled independently"""
+
+    def __init__(self, pattern):
+        if not pattern:
+            raise ValueError("empty fixed pattern")
+        self.pattern = bytes(pattern)
+        self.name = "0x" + self.pattern.hex()
+        self._tile = b""
+
+    def fill(self, view, offset):
+        n = len(view)
+        plen = len(self.pattern)
+        tile = self._tile
+        if len(tile) < n + plen:
+            tile = self._tile = self.pattern * (-(-(n + plen) // plen))
+        phase = offset % plen
+        view[:] = memoryview(tile)[phase:phase + n]
+
+    def describe(self):
+        return {"pattern": self.name}
+
+    def state(self):
+        return self.describe()
+
+
+class KeystreamPattern:
+    """Seekable random pattern: byte i of the device is byte i of a keystream.
+    The key is drawn once from the OS RNG; fill() writes in place, so a pass
+    does no per-chunk allocation and any offset can be produced independently."""
+
+    CIPHERS = ("aes-ctr", "chacha20", "shake256")
+    SHAKE_SEGMENT = 64 * 1024
+
+    def __init__(self, cipher=None, key=None):
+        if cipher is None:
+            cipher = "aes-ctr" if Cipher is not None else "shake256"
+        if cipher not in self.CIPHERS:
+            raise ValueError(f"unknown keystream cipher: {cipher}")
+        if cipher != "shake256" and Cipher is None:
+            raise RuntimeError(f"{cipher} requires the 'cryptography' package")
+        self.name = cipher
+        self.key = key if key is not None else os.urandom(32)
+        # AES-CTR counts 16-byte blocks, ChaCha20 64-byte blocks
+        self.unit = {"aes-ctr": 16, "chacha20": 64, "shake256": self.SHAKE_SEGMENT}[cipher]
+
+    def _encryptor(self, block):
+        if self.name == "aes-ctr":
+            iv = (block % (1 << 128)).to_bytes(16, "big")
+            return Cipher(algorithms.AES(self.key), modes.CTR(iv)).encryptor()
+        # ChaCha20: 32-bit little-endian block counter + 96-bit nonce carrying the high bits
+        nonce = (block & 0xFFFFFFFF).to_bytes(4, "little") + (block >> 32).to_bytes(12, "little")
+        return Cipher(algorithms.ChaCha20(self.key, nonce), mode=None).encryptor()
+
+    def fill(self, view, offset):
+        n = len(view)
+        if n == 0:
+            return
+        if offset % self.unit:
+            # Misaligned start (only at odd-sized image tails): generate from the
+            # previous unit boundary and copy the wanted part
+            skip = offset % self.unit
+            scratch = bytearray(n + skip)
+            self.fill(memoryview(scratch), offset - skip)
+            view[:] = scratch[skip:]
+            return
+        if self.name == "shake256":
+            self._fill_shake(view, offset)
+            return
+        pos = 0
+        while pos < n:
+            block = (offset + pos) // self.unit
+            # ChaCha20's block counter is 32 bits: never let one call wrap it
+            span = n - pos
+            if self.name == "chacha20":
+                span = min(span, ((1 << 32) - (block & 0xFFFFFFFF)) * self.unit)
+            enc = self._encryptor(block)
+            enc.update_into(zeros(span), view[pos:pos + span])
+            pos += span
+
+    def _fill_shake(self, view, offset):
+        seg = self.SHAKE_SEGMENT
+        pos = 0
+        while pos < len(view):
+            index = (offset + pos) // seg
+            n = min(seg, len(view) - pos)
+            view[pos:pos + n] = hashlib.shake_256(self.key + index.to_bytes(8, "little")).digest(seg)[:n]
+            pos += n
+
+    def describe(self):
+        return {"pattern": "random", "keystream": self.name}
+
+    def state(self):
+        """describe() plus the key, enough to regenerate the stream later"""
+        return dict(self.describe(), seed=self.key.hex())
+
+
+def make_pattern(name, **kwargs):
+    """'zero', 'ones', 'random' (fresh keystream seed) or a hex byte pattern
+    such as '0x55' / '0x924924'; pattern objects pass through"""
+    if not isinstance(name, str):
+        return name
+    if name == "zero":
+        return ZeroPattern()
+    if name == "ones":
+        return FixedPattern(b"\xff")
+    if name == "random":
+        return KeystreamPattern(**kwargs)
+    if name.lower().startswith("0x"):
+        try:
+            return FixedPattern(bytes.fromhex(name[2:]))
+        except ValueError:
+            pass
+    raise ValueError(f"unknown pattern: {name}")
+
+
+def restore_pattern(state):
+    """Rebuild a pattern from its state() (e.g. stored in the wipe journal)"""
+    if state.get("pattern") == "random":
+        return KeystreamPattern(state["keystream"], bytes.fromhex(state["seed"]))
+    return make_pattern(state["pattern"])
@@ -0,0 +1,198 @@
+import os
+import json
+import subprocess
+import threading
+from datetime import datetime
+
+from journal import atomic_write_json
+
+# Drive identity from `smartctl --json -i`, cached in memory and on disk by
+# WWN (or serial), so the same drive is asked once rather than once per
+# refresh, type check and wipe. A device node is re-queried only when its
+# identity changes (another drive in the bay, new media in a reader).
+SMARTCTL_CMD = ["smartctl", "--json", "-i"]
+SMARTCTL_TIMEOUT = 30
+USB_BRIDGES = ("usbcypress", "usbjmicron", "usbprolific", "usbsunplus", "usbasm1352r",
+               "sntasmedia", "sntjmicron", "sntrealtek")
+
+
+def normalize_id(value):
+    """Comparable form of a WWN / serial: 'naa.5000C500...' and '5 000c50 0...' match"""
+    if not value:
+        return None
+    value = str(value).strip().lower().replace(" ", "")
+    for prefix in ("naa.", "eui.", "0x"):
+        if value.startswith(prefix):
+            value = value[len(prefix):]
+    return value or None
+
+
+class SmartInfo:
+    """Identity fields of one drive as smartctl reports them"""
+
+    FIELDS = ("model", "serial", "firmware", "wwn", "family", "protocol", "device_type",
+              "capacity_bytes", "rotation_rate", "logical_block_size", "physical_block_size",
+              "exit_status", "cached_at")
+
+    def __init__(self, **fields):
+        for name in self.FIELDS:
+            setattr(self, name, fields.get(name))
+
+    @classmethod
+    def from_json(cls, data):
+        wwn = data.get("wwn")
+        if isinstance(wwn, dict):
+            # same digits smartctl prints as 'LU WWN Device Id: 5 000c50 0a1b2c3d4'
+            wwn = f"{wwn.get('naa', 0):x}{wwn.get('oui', 0):06x}{wwn.get('id', 0):09x}"
+        device = data.get("device") or {}
+        return cls(
+            model=data.get("model_name") or data.get("scsi_model_name") or data.get("scsi_product"),
+            serial=data.get("serial_number"),
+            firmware=data.get("firmware_version") or data.get("scsi_revision"),
+            wwn=wwn,
+            family=data.get("model_family"),
+            protocol=device.get("protocol"),
+            device_type=device.get("type"),
+            capacity_bytes=(data.get("user_capacity") or {}).get("bytes")
+                           or data.get("nvme_total_capacity"),
+            rotation_rate=data.get("rotation_rate"),
+            logical_block_size=data.get("logical_block_size"),
+            physical_block_size=data.get("physical_block_size"),
+            exit_status=(data.get("smartctl") or {}).get("exit_status"),
+            cached_at=datetime.now().isoformat(),
+        )
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+    def key(self):
+        return normalize_id(self.wwn) or normalize_id(self.serial)
+
+    def interface(self):
+        """'nvme' / 'usb' / 'ata' like driver.detect_device_type, None when unclear"""
+        dtype = (self.device_type or "").lower()
+        if dtype in USB_BRIDGES or dtype.startswith("usb"):
+            return "usb"
+        protocol = (self.protocol or "").lower()
+        if protocol == "nvme":
+            return "nvme"
+        if protocol == "ata":
+            return "ata"
+        return None
+
+
+class SmartCache:
+    """SmartInfo per drive, keyed by normalized WWN/serial and kept in `path`
+    (None: memory only). lookup(device, identity) maps a device node to its
+    record; identity is whatever identifies the drive currently behind the
+    node (WWN, serial, size, diskseq from the inventory), and a node whose
+    identity changed is queried again. runner(cmd) -> stdout is swappable."""
+
+    def __init__(self, path=None, runner=None):
+        self.path = path
+        self.runner = runner or self._smartctl
+        self.hits = 0
+        self.queries = 0
+        self._records = {}
+        self._nodes = {}
+        self._diskseq = {}  # record key -> diskseq it was last seen with (this boot only)
+        self._serials = {}  # normalized serial -> record key (records are keyed by WWN first)
+        self._lock = threading.Lock()
+        self._load()
+
+    @staticmethod
+    def _smartctl(cmd):
+        # smartctl's exit status is a bit mask: warnings still come with usable JSON
+        return subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                              text=True, timeout=SMARTCTL_TIMEOUT).stdout
+
+    def _load(self):
+        if not self.path:
+            return
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            self._records = {k: SmartInfo.from_dict(v) for k, v in data.get("drives", {}).items()}
+        except (OSError, ValueError, TypeError):
+            self._records = {}
+        for key, record in self._records.items():
+            if normalize_id(record.serial):
+                self._serials[normalize_id(record.serial)] = key
+
+    def _save(self):
+        if not self.path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            atomic_write_json(self.path, {"drives": {k: r.as_dict() for k, r in self._records.items()}})
+        except OSError:
+            pass  # the cache is an optimisation; never fail a job over it
+
+    def lookup(self, device, identity=None):
+        """SmartInfo for the drive behind device, or None when smartctl has
+        nothing usable. identity: dict of wwn / serial / size / diskseq."""
+        identity = identity or {}
+        with self._lock:
+            node = self._nodes.get(device)
+            if node and node[0] == identity:
+                self.hits += 1
+                return node[1]
+            # a known drive in a new node (or after a restart): no query needed
+            key = self._known(identity)
+            if key:
+                self._nodes[device] = (identity, self._records[key])
+                self.hits += 1
+                return self._records[key]
+        info = self.query(device)
+        with self._lock:
+            if info is None or not info.key():
+                return info
+            self._records[info.key()] = info
+            if normalize_id(info.serial):
+                self._serials[normalize_id(info.serial)] = info.key()
+            if identity.get("diskseq") is not None:
+                self._diskseq[info.key()] = identity["diskseq"]
+            self._nodes[device] = (identity, info)
+            self._save()
+        return info
+
+    def _known(self, identity):
+        # A WWN is unique; a serial alone is not (USB bridges often report
+        # '000000000000' for every drive), so a serial match also needs the
+        # same size and, when both are known, the same diskseq.
+        wwn = normalize_id(identity.get("wwn"))
+        if wwn and wwn in self._records:
+            return wwn
+        # sysfs wwids (eui./nvme./t10.) need not match smartctl's NAA WWN
+        serial = normalize_id(identity.get("serial"))
+        key = self._serials.get(serial) if serial else None
+        record = self._records.get(key)
+        if record is None or not identity.get("size") or identity["size"] != record.capacity_bytes:
+            return None
+        seen = self._diskseq.get(key)
+        if seen is not None and identity.get("diskseq") not in (None, seen):
+            return None
+        return key
+
+    def query(self, device):
+        """Run smartctl for device, bypassing the cache"""
+        self.queries += 1
+        try:
+            data = json.loads(self.runner(SMARTCTL_CMD + [device]) or "{}")
+        except (OSError, ValueError, subprocess.SubprocessError):
+            return None
+        if not (data.get("model_name") or data.get("serial_number") or data.get("device")):
+            return None
+        return SmartInfo.from_json(data)
+
+    def forget(self, device=None):
+        """Drop the node -> drive mapping (hotplug); drive records stay cached"""
+        with self._lock:
+            if device is None:
+                self._nodes.clear()
+            else:
+                self._nodes.pop(device, None)
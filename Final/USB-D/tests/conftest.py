@@ -0,0 +1,50 @@
+import os
+import sys
+
+import pytest
+
+# The modules under test live one directory up, next to driver.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text)
+
+
+def add_disk(root, name, sectors, bus="usb1/1-1/1-1:1.0", model=None, serial=None, wwid=None,
+             partitions=(), holders=()):
+    """Fake /sys/block/<name>: a symlink into sys/devices like the kernel's, so
+    the transport can be read off the resolved path"""
+    real = os.path.join(root, "sys/devices/pci0000:00", bus, "block", name)
+    write(os.path.join(real, "size"), f"{sectors}\n")
+    write(os.path.join(real, "removable"), "1\n")
+    write(os.path.join(real, "queue/rotational"), "0\n")
+    write(os.path.join(real, "queue/logical_block_size"), "512\n")
+    write(os.path.join(real, "queue/physical_block_size"), "4096\n")
+    if model:
+        write(os.path.join(real, "device/model"), f"{model}   \n")
+    if serial:
+        write(os.path.join(real, "device/serial"), f"{serial}\n")
+    if wwid:
+        write(os.path.join(real, "wwid"), f"{wwid}\n")
+    for number, part in enumerate(partitions, 1):
+        write(os.path.join(real, part, "partition"), f"{number}\n")
+    for holder in holders:
+        os.makedirs(os.path.join(real, "holders", holder))
+    os.makedirs(os.path.join(root, "sys/block"), exist_ok=True)
+    os.symlink(real, os.path.join(root, "sys/block", name))
+    return real
+
+
+@pytest.fixture
+def sysfs(tmp_path):
+    """Root with one USB stick (sdb, a mounted partition) and a loop device"""
+    root = str(tmp_path)
+    add_disk(root, "sdb", 2048, model="Flash Disk", serial="AA00123", wwid="naa.5000c500a1b2c3d4",
+             partitions=["sdb1"])
+    add_disk(root, "loop0", 128, bus="virtual")
+    write(os.path.join(root, "proc/self/mounts"),
+          "/dev/sdb1 /media/usb vfat rw 0 0\nproc /proc proc rw 0 0\n")
+    return root
@@ -0,0 +1,27 @@
+from autotune import BLOCK_LADDER, MIN_TRIAL_ROUNDS, PROBE_BUDGET, plan_trials
+
+MiB = 1024**2
+
+
+def test_plan_fits_budget():
+    candidates = [(bs, 1) for bs in BLOCK_LADDER]
+    plan, skipped = plan_trials(candidates, 1024 * MiB)
+    assert skipped == []
+    assert sum(n for _, _, n in plan) <= PROBE_BUDGET
+    for bs, depth, n in plan:
+        assert n >= bs * depth * MIN_TRIAL_ROUNDS
+        assert n % bs == 0
+
+
+def test_plan_drops_largest_but_keeps_default():
+    default = (16 * MiB, 8)
+    candidates = [(bs, 16) for bs in BLOCK_LADDER] + [default]
+    plan, skipped = plan_trials(candidates, 1024 * MiB, keep=default)
+    assert default in [(bs, d) for bs, d, _ in plan]
+    assert skipped and default not in skipped
+    assert sum(n for _, _, n in plan) <= PROBE_BUDGET
+
+
+def test_plan_respects_device_limit():
+    plan, _ = plan_trials([(MiB, 1), (4 * MiB, 1)], 8 * MiB)
+    assert all(n <= 8 * MiB for _, _, n in plan)
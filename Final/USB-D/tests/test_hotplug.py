@@ -0,0 +1,53 @@
+from conftest import add_disk
+from hotplug import HotplugService, QueueSource, parse_uevent, partition_added, touches_device
+from inventory import Inventory
+
+
+def uevent(action, devpath, **keys):
+    """Kernel uevent datagram as read from the netlink socket"""
+    fields = [f"{action}@{devpath}", f"ACTION={action}", f"DEVPATH={devpath}"]
+    fields += [f"{k}={v}" for k, v in keys.items()]
+    return "\0".join(fields).encode() + b"\0"
+
+
+def test_parse_uevent():
+    event = parse_uevent(uevent("add", "/devices/x/block/sdc/sdc1", SUBSYSTEM="block",
+                                DEVNAME="sdc1", DEVTYPE="partition", PARTN="1"))
+    assert event["ACTION"] == "add"
+    assert event["DEVNAME"] == "sdc1"
+    assert partition_added("/dev/sdc", 1)(event)
+    assert not partition_added("/dev/sdc", 2)(event)
+    assert touches_device("/dev/sdc")(event)
+    assert parse_uevent(b"libudev\0\xfe\xed") is None
+
+
+def test_replayed_events_update_inventory(sysfs):
+    inv = Inventory(sysfs_root=sysfs)
+    inv.refresh()
+    source = QueueSource()
+    service = HotplugService(inv, source).start()
+    try:
+        mark = service.mark()
+        add_disk(sysfs, "sdc", 4096, serial="CC01", partitions=["sdc1"])
+        for data in (uevent("add", "/devices/x/block/sdc", SUBSYSTEM="block", DEVNAME="sdc",
+                            DEVTYPE="disk"),
+                     uevent("add", "/devices/x/block/sdc/sdc1", SUBSYSTEM="block",
+                            DEVNAME="sdc1", DEVTYPE="partition", PARTN="1")):
+            source.put(parse_uevent(data))
+        # the partition event was queued before the wait started: since= catches it
+        event = service.wait_for(partition_added("/dev/sdc"), timeout=5, since=mark)
+        assert event["DEVNAME"] == "sdc1"
+        assert inv.get("/dev/sdc").partitions == ["/dev/sdc1"]
+        assert service.settle(touches_device("/dev/sdc"), quiet=0.1, timeout=2)
+
+        source.put(parse_uevent(uevent("remove", "/devices/x/block/sdc", SUBSYSTEM="block",
+                                       DEVNAME="sdc", DEVTYPE="disk")))
+        assert service.wait_for(touches_device("/dev/sdc"), timeout=5) is not None
+        assert inv.get("/dev/sdc") is None
+    finally:
+        service.stop()
+
+
+def test_wait_for_times_out(sysfs):
+    service = HotplugService(Inventory(sysfs_root=sysfs), QueueSource())
+    assert service.wait_for(partition_added("/dev/sdb"), timeout=0.05) is None
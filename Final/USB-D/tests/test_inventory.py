@@ -0,0 +1,37 @@
+import os
+
+from conftest import add_disk
+from inventory import Inventory, read_sysfs_device, _sysfs_mounts
+
+
+def test_read_sysfs_device(sysfs):
+    dev = read_sysfs_device(sysfs, "sdb", _sysfs_mounts(sysfs))
+    assert dev.path == "/dev/sdb"
+    assert dev.size == 2048 * 512
+    assert dev.model == "Flash Disk"
+    assert dev.serial == "AA00123"
+    assert dev.wwn == "naa.5000c500a1b2c3d4"
+    assert dev.transport == "usb"
+    assert dev.interface_hint() == "usb"
+    assert dev.rotational is False and dev.removable is True
+    assert dev.physical_block_size == 4096
+    assert dev.partitions == ["/dev/sdb1"]
+    assert dev.mountpoints == ["/media/usb"]
+
+
+def test_inventory_hides_loop_devices(sysfs):
+    inv = Inventory(sysfs_root=sysfs)
+    assert [d.path for d in inv.devices()] == ["/dev/sdb"]
+    assert [d.path for d in inv.devices(hidden=True)] == ["/dev/loop0", "/dev/sdb"]
+    assert inv.get("/dev/loop0").type == "loop"
+
+
+def test_inventory_reload_and_remove(sysfs):
+    inv = Inventory(sysfs_root=sysfs)
+    assert inv.get("/dev/sdc") is None
+    add_disk(sysfs, "sdc", 4096, serial="BB99")
+    assert inv.reload("sdc").serial == "BB99"
+    assert inv.get("/dev/sdc").size == 4096 * 512
+    os.remove(os.path.join(sysfs, "sys/block/sdc"))
+    assert inv.reload("sdc") is None
+    assert inv.get("/dev/sdc") is None
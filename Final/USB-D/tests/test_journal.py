@@ -0,0 +1,66 @@
+import os
+
+from journal import WipeJournal, journal_path
+
+SIZE = 64 * 1024**2
+DEVMETA = {"device": "/dev/sdb", "serial": "AA00123", "wwn": None, "model": "Flash Disk",
+           "capacity_bytes": SIZE}
+SCHEDULE = ["random", "zero"]
+
+
+class Log:
+    def __init__(self):
+        self.lines = []
+
+    def write(self, text):
+        self.lines.append(text)
+
+
+def open_journal(path, devmeta=DEVMETA, resume=True, size=SIZE, logf=None):
+    return WipeJournal.open(path, devmeta, "shred", SCHEDULE, {}, "wipe.log",
+                            resume=resume, logf=logf, size=size)
+
+
+def interrupted(tmp_path):
+    path = journal_path(str(tmp_path), DEVMETA)
+    journal = open_journal(path, resume=False)
+    journal.set_pattern(0, {"pattern": "random", "keystream": "shake256", "seed": "00" * 32})
+    journal.begin_pass(0, 0)
+    journal.checkpoint(0, SIZE // 2)
+    journal.end_pass(0)
+    journal.begin_pass(1, 0)
+    journal.checkpoint(1, 4096)
+    return path
+
+
+def test_round_trip_resume(tmp_path):
+    path = interrupted(tmp_path)
+    assert os.path.basename(path) == "journal_AA00123.json"
+    journal = open_journal(path)
+    assert journal.resumed
+    assert (journal.pass_index, journal.offset) == (1, 4096)
+    assert journal.start_for(0) is None
+    assert journal.start_for(1) == 4096
+    assert journal.pattern_state(0)["seed"] == "00" * 32
+    assert journal.summary()["sessions"][-1]["resumed_at"] == {"pass": 1, "offset": 4096}
+    journal.complete()
+    assert not os.path.exists(path)
+
+
+def test_resume_refused_without_identity(tmp_path):
+    path = interrupted(tmp_path)
+    log = Log()
+    anonymous = dict(DEVMETA, serial=None, wwn=None)
+    journal = open_journal(path, devmeta=anonymous, logf=log)
+    assert not journal.resumed and journal.offset == 0
+    assert "not resuming" in "".join(log.lines)
+
+
+def test_resume_refused_on_size_change(tmp_path):
+    path = interrupted(tmp_path)
+    assert not open_journal(path, size=SIZE * 2).resumed
+
+
+def test_resume_refused_for_other_device(tmp_path):
+    path = interrupted(tmp_path)
+    assert not open_journal(path, devmeta=dict(DEVMETA, model="Other")).resumed
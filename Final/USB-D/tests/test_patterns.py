@@ -0,0 +1,34 @@
+import pytest
+
+from patterns import KeystreamPattern, make_pattern, restore_pattern
+
+
+@pytest.mark.parametrize("cipher", KeystreamPattern.CIPHERS)
+def test_keystream_seek_matches_sequential(cipher):
+    pattern = make_pattern("random", cipher=cipher)
+    size = 3 * KeystreamPattern.SHAKE_SEGMENT + 1000
+    whole = bytearray(size)
+    pattern.fill(memoryview(whole), 0)
+    # aligned and misaligned starts, spanning cipher block and segment boundaries
+    for offset, n in [(0, 16), (64, 4096), (65536, 70000), (17, 100), (size - 1001, 1001)]:
+        part = bytearray(n)
+        pattern.fill(memoryview(part), offset)
+        assert part == whole[offset:offset + n]
+
+
+def test_restore_pattern_regenerates_stream():
+    pattern = make_pattern("random")
+    again = restore_pattern(pattern.state())
+    a, b = bytearray(8192), bytearray(8192)
+    pattern.fill(memoryview(a), 1 << 30)
+    again.fill(memoryview(b), 1 << 30)
+    assert a == b and any(a)
+
+
+def test_fixed_patterns():
+    buf = bytearray(7)
+    make_pattern("0x924924").fill(memoryview(buf), 1)
+    assert buf == bytes.fromhex("49249249249249")
+    assert isinstance(restore_pattern({"pattern": "zero"}), type(make_pattern("zero")))
+    with pytest.raises(ValueError):
+        make_pattern("0xzz")
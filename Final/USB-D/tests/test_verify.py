@@ -0,0 +1,50 @@
+import threading
+
+from verify import DirtyMap, SamplePlan, is_zero, sample_count
+
+MiB = 1024**2
+
+
+def test_sample_plan_is_stratified_and_reproducible():
+    plan = SamplePlan(1024 * MiB, MiB, 0.99, 0.01, seed=42)
+    assert plan.strata == sample_count(0.99, 0.01)
+    assert plan.offsets == sorted(set(plan.offsets))
+    assert plan.offsets[0] == 0 and plan.offsets[-1] == 1023 * MiB
+    assert all(off % MiB == 0 for off in plan.offsets)
+    assert SamplePlan(1024 * MiB, MiB, 0.99, 0.01, seed=42).offsets == plan.offsets
+    assert plan.as_dict()["seed"] == 42
+
+
+def test_sample_plan_small_device_checks_every_block():
+    plan = SamplePlan(8 * MiB, MiB, 0.99, 0.001, seed=1)
+    assert plan.offsets == [i * MiB for i in range(8)]
+
+
+def test_dirty_map_merges_out_of_order_ranges():
+    dirty = DirtyMap()
+    for start, end in [(4096, 8192), (0, 512), (512, 1024), (6000, 10000)]:
+        dirty.add(start, end)
+    assert dirty.intervals() == [[0, 1024], [4096, 10000]]
+    assert dirty.first == 0
+    assert dirty.dirty_bytes() == 1024 + 5904
+    assert dirty.as_dict()["range_count"] == 2
+
+
+def test_dirty_map_limit_and_threads():
+    dirty = DirtyMap(limit=100 * 512)
+    workers = [threading.Thread(target=lambda t=t: [dirty.add(o, o + 512)
+                                                    for o in range(t * 512, 400 * 512, 4 * 512)])
+               for t in range(4)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    assert dirty.full
+    assert dirty.intervals() == [[0, 400 * 512]]
+
+
+def test_is_zero_methods():
+    for method in ("memcmp", "numpy", "count"):
+        assert is_zero(bytearray(4096), method)
+        assert is_zero(bytes(4096), method)
+        assert not is_zero(bytearray(4095) + b"\1", method)
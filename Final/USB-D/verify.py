@@ -0,0 +1,605 @@
+import os
+import ctypes
+import errno
+import math
+import mmap
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from blockdev import drop_cached_pages, logical_block_size
+from patterns import ZeroPattern, zero_buffer
+from wipe_engine import (Cancelled, aligned_buffer, open_target, split_stripes, STRIPE_ALIGN,
+                         PROGRESS_INTERVAL)
+
+# Verification kernels. Checking a block for zeros is one C-level compare
+# against a shared zero buffer, so scans are bound by the device, not by a
+# Python loop over every byte. Reads use O_DIRECT so a pass cannot be
+# satisfied from zeros still sitting in the page cache after the write.
+ZERO_CHECKS = ("memcmp", "numpy", "count")
+VERIFY_BLOCK = 1024 * 1024
+MMAP_WINDOW = 64 * 1024**2  # bytes mapped at a time by mmap_scan_zero
+SAMPLE_BATCH = 64           # iovecs per preadv when sampled blocks are adjacent
+DIRTY_UNIT = 512            # granularity of the bad-region map inside a failed block
+MAX_REPORTED_RANGES = 1000  # ranges listed in DirtyMap.as_dict()
+
+_memcmp = None
+
+
+def _libc_memcmp():
+    global _memcmp
+    if _memcmp is None:
+        try:
+            _memcmp = ctypes.CDLL(None).memcmp
+            _memcmp.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_size_t]
+            _memcmp.restype = ctypes.c_int
+        except (OSError, AttributeError):
+            _memcmp = False
+    return _memcmp
+
+
+def is_zero(view, method="memcmp"):
+    """True when every byte of view (bytes, bytearray, memoryview, mmap) is zero.
+    memcmp: libc memcmp against a zero buffer through ctypes, which drops the
+            GIL for the call, so reader threads check blocks in parallel.
+            Read-only buffers (bytes, PROT_READ mappings) cannot be handed to
+            ctypes without a copy and use bytes.startswith, which holds it.
+    numpy:  numpy.count_nonzero (holds the GIL; falls back to memcmp without numpy)
+    count:  bytes.count over a copy, for comparison in benchmarks"""
+    if method == "numpy" and numpy is not None:
+        return not numpy.count_nonzero(numpy.frombuffer(view, dtype=numpy.uint8))
+    if method == "count":
+        data = bytes(view)
+        return data.count(0) == len(data)
+    n = len(view)
+    memcmp = _libc_memcmp()
+    if memcmp and n:
+        try:
+            ptr = ctypes.c_char.from_buffer(view)
+        except TypeError:
+            pass  # read-only
+        else:
+            return memcmp(zero_buffer(n), ctypes.addressof(ptr), n) == 0
+    return zero_buffer(n).startswith(view)
+
+
+def block_checker(pattern=None, zero_check="memcmp"):
+    """check(view, offset) -> True when view holds what pattern wrote at offset.
+    No pattern (or zero) is a plain zero check. Other patterns regenerate the
+    expected bytes for that offset into a scratch buffer (keystreams are
+    seekable) and memcmp them, so random passes verify without stored data.
+    Scratch buffers are per checker: use one checker per thread."""
+    if pattern is None or isinstance(pattern, ZeroPattern):
+        return lambda view, offset: is_zero(view, zero_check)
+    scratch = {}
+
+    def check(view, offset):
+        n = len(view)
+        if n not in scratch:
+            scratch[n] = bytearray(n)
+        expected = scratch[n]
+        pattern.fill(memoryview(expected), offset)
+        return expected == view  # bytearray on the left: C-level compare
+    return check
+
+
+class DirtyMap:
+    """Coalesced [start, end) ranges that failed verification. Scanners given a
+    map keep going after a mismatch and stop only once `limit` dirty bytes are
+    recorded (None: scan everything). Safe to share between reader threads."""
+
+    def __init__(self, limit=None):
+        self.limit = limit
+        self.truncated = False
+        self._ranges = []
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def add(self, start, end):
+        with self._lock:
+            last = self._ranges[-1] if self._ranges else None
+            if last and last[1] == start:
+                last[1] = end
+            else:
+                self._ranges.append([start, end])
+            self._bytes += end - start
+            if self.limit is not None and self._bytes >= self.limit:
+                self.truncated = True
+
+    @property
+    def full(self):
+        return self.truncated
+
+    def intervals(self):
+        """Sorted, merged ranges (threads add out of order)"""
+        with self._lock:
+            ranges = sorted(self._ranges)
+        merged = []
+        for start, end in ranges:
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        return merged
+
+    @property
+    def first(self):
+        ranges = self.intervals()
+        return ranges[0][0] if ranges else None
+
+    def dirty_bytes(self):
+        return sum(end - start for start, end in self.intervals())
+
+    def as_dict(self):
+        ranges = self.intervals()
+        return {
+            "dirty_bytes": sum(end - start for start, end in ranges),
+            "range_count": len(ranges),
+            "ranges": ranges[:MAX_REPORTED_RANGES],
+            "ranges_listed": min(len(ranges), MAX_REPORTED_RANGES),
+            "limit": self.limit,
+            "stopped_at_limit": self.truncated,
+        }
+
+
+def record_mismatch(dirty_map, view, offset, check, unit=DIRTY_UNIT):
+    """Add the unit-sized pieces of a failed block that really differ"""
+    for i in range(0, len(view), unit):
+        if not check(view[i:i + unit], offset + i):
+            dirty_map.add(offset + i, offset + min(len(view), i + unit))
+
+
+def open_verify(device, direct=True):
+    """Read-only fd for verification. With direct, O_DIRECT is probed with one
+    aligned read; where it is refused the device's cached pages are dropped
+    instead (BLKFLSBUF / POSIX_FADV_DONTNEED) so reads still reach the media.
+    Returns (fd, read_mode, align) where read_mode is 'o_direct' or the drop used."""
+    fd, used = open_target(device, write=False, direct=direct)
+    if used:
+        align = logical_block_size(device, fd)
+        probe = aligned_buffer(max(align, mmap.PAGESIZE))
+        try:
+            os.preadv(fd, [memoryview(probe)[:align]], 0)
+            return fd, "o_direct", align
+        except OSError as e:
+            if e.errno != errno.EINVAL:
+                os.close(fd)
+                raise
+        finally:
+            probe.close()
+        os.close(fd)
+        fd, used = open_target(device, write=False, direct=False)
+    return fd, drop_cached_pages(device, fd), 1
+
+
+def pread_full(fd, view, offset):
+    """preadv until view is full or EOF; returns bytes read"""
+    got = 0
+    while got < len(view):
+        n = os.preadv(fd, [view[got:]], offset + got)
+        if n <= 0:
+            break
+        got += n
+    return got
+
+
+def aligned_read_len(remaining, block_size, align):
+    # O_DIRECT lengths must be block multiples; reading past a short end is harmless
+    n = min(block_size, remaining)
+    return min(block_size, -(-n // align) * align)
+
+
+def scan_zero(device, start=0, end=None, block_size=VERIFY_BLOCK, zero_check="memcmp",
+              cancel_flag=None, progress=None, direct=True, report=None, pattern=None,
+              dirty_map=None, on_block=None):
+    """Read [start, end) of device into one reused aligned buffer and zero-check
+    each block (or compare it with pattern, see block_checker). Returns the
+    offset of the first mismatching block, or None when clean; raises Cancelled
+    when cancel_flag is set. report (a dict) receives the read mode used.
+    With a DirtyMap, mismatches are recorded and the scan carries on.
+    on_block(view, offset) sees every block read (e.g. RegionHasher.update);
+    with it a full DirtyMap no longer ends the scan."""
+    check = block_checker(pattern, zero_check)
+    fd, mode, align = open_verify(device, direct)
+    buf = aligned_buffer(block_size)
+    view = memoryview(buf)
+    try:
+        if report is not None:
+            report["read_mode"] = mode
+        if end is None:
+            end = os.lseek(fd, 0, os.SEEK_END)
+        start -= start % align  # O_DIRECT offsets must be block aligned
+        pos = start
+        started = last_report = time.monotonic()
+        while pos < end:
+            if cancel_flag is not None and cancel_flag.is_set():
+                raise Cancelled()
+            want = aligned_read_len(end - pos, block_size, align)
+            n = min(pread_full(fd, view[:want], pos), end - pos)
+            if not n:
+                break
+            if on_block is not None:
+                on_block(view[:n], pos)
+            if not check(view[:n], pos):
+                if dirty_map is None:
+                    return pos
+                if not dirty_map.full:
+                    record_mismatch(dirty_map, view[:n], pos, check)
+                if dirty_map.full and on_block is None:
+                    break
+            pos += n
+            now = time.monotonic()
+            if progress and now - last_report >= PROGRESS_INTERVAL:
+                progress(pos - start, end - start, now - started)
+                last_report = now
+    finally:
+        view.release()
+        buf.close()
+        os.close(fd)
+    return dirty_map.first if dirty_map is not None else None
+
+
+def scan_ranges(device, ranges, block_size=VERIFY_BLOCK, zero_check="memcmp", cancel_flag=None,
+                direct=True, pattern=None, dirty_map=None):
+    """scan_zero over just the given [start, end) ranges (e.g. after they were
+    rewritten). Returns the first mismatching offset or None."""
+    dirty = []
+    for start, end in ranges:
+        found = scan_zero(device, start, end, block_size, zero_check, cancel_flag,
+                          direct=direct, pattern=pattern, dirty_map=dirty_map)
+        if found is not None:
+            dirty.append(found)
+            if dirty_map is None or dirty_map.full:
+                break
+    return min(dirty) if dirty else None
+
+
+class InlineVerifier:
+    """Read-after-write verification that trails the writer. The engine calls
+    start(pattern) before the final pass, wrote(offset, n) after each write
+    (from any writer thread) and finish() once the pass is flushed. A reader
+    thread re-reads every written extent through open_verify and checks it
+    against pattern, so verification ends with the wipe instead of needing a
+    second walk of the device.
+
+    The writer waits whenever more than `lag` written bytes are still unread.
+    With batch (rotational media) extents are collected until `batch` bytes are
+    pending and then read back in one sorted sweep, so the head moves between
+    the write and read positions once per batch instead of once per chunk.
+    Read errors fail the verification, never the wipe; `covered` records what
+    was read back, so the caller can scan whatever the writer did not report
+    (e.g. the part of a resumed pass written before the restart)."""
+
+    def __init__(self, device, lag=256 * 1024**2, batch=0, block_size=VERIFY_BLOCK,
+                 zero_check="memcmp", direct=True, dirty_map=None):
+        self.device = device
+        self.block_size = block_size
+        self.batch = batch
+        self.lag = max(lag, batch, block_size)
+        self.zero_check = zero_check
+        self.direct = direct
+        self.dirty_map = dirty_map if dirty_map is not None else DirtyMap()
+        self.covered = DirtyMap()  # used as a plain coalescing range set
+        self.pattern = None
+        self.read_mode = None
+        self.error = None
+        self.max_behind = 0
+        self._pending = []
+        self._pending_bytes = 0
+        self._queued = 0
+        self._queue = []
+        self._cond = threading.Condition()
+        self._thread = None
+        self._fd = None
+
+    def start(self, pattern=None):
+        self.pattern = pattern
+        self._fd, self.read_mode, self._align = open_verify(self.device, self.direct)
+        self._thread = threading.Thread(target=self._read_back, daemon=True)
+        self._thread.start()
+
+    def wrote(self, offset, n):
+        with self._cond:
+            if self._thread is None or self.error is not None:
+                return
+            self._pending.append((offset, offset + n))
+            self._pending_bytes += n
+            if self._pending_bytes >= self.batch:
+                self._push()
+            self.max_behind = max(self.max_behind, self._queued + self._pending_bytes)
+            while self._queued > self.lag and self.error is None and self._thread.is_alive():
+                self._cond.wait(0.1)
+
+    def _push(self):
+        # caller holds the lock; sorting puts a batch in one sweep across the media
+        if self._pending:
+            self._queue.append(sorted(self._pending))
+            self._queued += self._pending_bytes
+            self._pending = []
+            self._pending_bytes = 0
+            self._cond.notify_all()
+
+    def _read_back(self):
+        check = block_checker(self.pattern, self.zero_check)
+        buf = aligned_buffer(self.block_size)
+        view = memoryview(buf)
+        try:
+            while True:
+                with self._cond:
+                    while not self._queue:
+                        self._cond.wait()
+                    extents = self._queue.pop(0)
+                if extents is None:
+                    break
+                for start, end in extents:
+                    pos = start - start % self._align
+                    while pos < end:
+                        want = aligned_read_len(end - pos, self.block_size, self._align)
+                        n = min(pread_full(self._fd, view[:want], pos), end - pos)
+                        if not n:
+                            break
+                        if not self.dirty_map.full and not check(view[:n], pos):
+                            record_mismatch(self.dirty_map, view[:n], pos, check)
+                        pos += n
+                    if min(pos, end) > start:
+                        self.covered.add(start, min(pos, end))
+                with self._cond:
+                    self._queued -= sum(end - start for start, end in extents)
+                    self._cond.notify_all()
+        except Exception as e:
+            with self._cond:
+                self.error = e
+                self._cond.notify_all()
+        finally:
+            view.release()
+            buf.close()
+
+    def finish(self):
+        """Read back what is still pending and stop the reader.
+        Returns the first mismatching offset, or None when clean."""
+        if self._thread is None:
+            return self.dirty_map.first
+        with self._cond:
+            self._push()
+            self._queue.append(None)
+            self._cond.notify_all()
+        self._thread.join()
+        self.close()
+        return self.dirty_map.first
+
+    def close(self):
+        """Stop without reading the rest (cancelled or failed pass)"""
+        if self._thread is not None and self._thread.is_alive():
+            with self._cond:
+                self._queue[:] = [None]
+                self._cond.notify_all()
+            self._thread.join()
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def as_dict(self):
+        return {
+            "lag": self.lag,
+            "batch": self.batch,
+            "max_behind": self.max_behind,
+            "read_back_bytes": self.covered.dirty_bytes(),
+            "read_mode": self.read_mode,
+            "error": str(self.error) if self.error else None,
+        }
+
+
+def parallel_scan_zero(device, threads=4, block_size=VERIFY_BLOCK, zero_check="memcmp",
+                       cancel_flag=None, progress=None, direct=True, report=None, pattern=None,
+                       dirty_map=None, on_block=None, stripe_align=STRIPE_ALIGN):
+    """scan_zero over stripes of the device with a pool of `threads` readers.
+    preadv and the memcmp zero check (on these writable buffers) release
+    the GIL, so stripes are read and checked concurrently. Without a
+    dirty_map every stripe stops once any stripe finds data; with one, all
+    stripes record into it until it is full. The verdict
+    is the lowest dirty offset found, or None when the device is clean.
+    on_block as for scan_zero; stripe_align lets each Merkle region fall in
+    one stripe, so it is read (and hashed) in order by a single thread."""
+    fd, mode, align = open_verify(device, direct)
+    if report is not None:
+        report["read_mode"] = mode
+    try:
+        size = os.lseek(fd, 0, os.SEEK_END)
+        stripes = split_stripes(0, size, threads, max(block_size, stripe_align))
+        stop = threading.Event()
+
+        def scan(stripe):
+            view = memoryview(aligned_buffer(block_size))
+            check = block_checker(pattern, zero_check)
+            pos = stripe.start
+            while pos < stripe.end and not stop.is_set():
+                want = aligned_read_len(stripe.end - pos, block_size, align)
+                n = min(pread_full(fd, view[:want], pos), stripe.end - pos)
+                if n <= 0:
+                    break
+                if on_block is not None:
+                    on_block(view[:n], pos)
+                if not check(view[:n], pos):
+                    if dirty_map is None:
+                        stop.set()
+                        return pos
+                    if not dirty_map.full:
+                        record_mismatch(dirty_map, view[:n], pos, check)
+                    if dirty_map.full and on_block is None:
+                        stop.set()
+                pos += n
+                stripe.done = pos - stripe.start
+            return None
+
+        with ThreadPoolExecutor(max_workers=max(1, len(stripes))) as pool:
+            futures = [pool.submit(scan, s) for s in stripes]
+            started = last_report = time.monotonic()
+            try:
+                while wait(futures, timeout=0.1).not_done:
+                    if cancel_flag is not None and cancel_flag.is_set():
+                        raise Cancelled()
+                    now = time.monotonic()
+                    if progress and now - last_report >= PROGRESS_INTERVAL:
+                        progress(sum(s.done for s in stripes), size, now - started)
+                        last_report = now
+            finally:
+                stop.set()
+            dirty = [f.result() for f in futures]
+    finally:
+        os.close(fd)
+    if dirty_map is not None:
+        return dirty_map.first
+    dirty = [d for d in dirty if d is not None]
+    return min(dirty) if dirty else None
+
+
+def mmap_scan_zero(device, start=0, end=None, window=MMAP_WINDOW, block_size=VERIFY_BLOCK,
+                   zero_check="memcmp", cancel_flag=None, progress=None, report=None,
+                   pattern=None, dirty_map=None, on_block=None):
+    """scan_zero without read copies: map the target window by window
+    (MADV_SEQUENTIAL for aggressive readahead), zero-check it in block_size
+    slices and unmap it before the next one. Works for block devices and
+    image files. Mappings always go through the page cache, so cached pages
+    are dropped first. Same return value and on_block as scan_zero."""
+    check = block_checker(pattern, zero_check)
+    fd = os.open(device, os.O_RDONLY)
+    try:
+        mode = drop_cached_pages(device, fd)
+        if report is not None:
+            report["read_mode"] = f"mmap+{mode}"
+        if end is None:
+            end = os.lseek(fd, 0, os.SEEK_END)
+        gran = mmap.ALLOCATIONGRANULARITY
+        window = max(gran, window - window % gran)
+        pos = start
+        started = last_report = time.monotonic()
+        while pos < end:
+            if cancel_flag is not None and cancel_flag.is_set():
+                raise Cancelled()
+            base = pos - pos % gran  # mmap offsets must be page aligned
+            n = min(window, end - base)
+            m = mmap.mmap(fd, n, prot=mmap.PROT_READ, offset=base)
+            try:
+                if hasattr(m, "madvise"):
+                    m.madvise(mmap.MADV_SEQUENTIAL)
+                with memoryview(m) as view:
+                    for off in range(pos - base, n, block_size):
+                        block = view[off:off + block_size]
+                        if on_block is not None:
+                            on_block(block, base + off)
+                        clean = check(block, base + off)
+                        if not clean and dirty_map is not None and not dirty_map.full:
+                            record_mismatch(dirty_map, block, base + off, check)
+                        block.release()  # the mapping cannot close while slices exist
+                        if not clean:
+                            if dirty_map is None:
+                                return base + off
+                            if dirty_map.full and on_block is None:
+                                break
+            finally:
+                m.close()
+            if dirty_map is not None and dirty_map.full and on_block is None:
+                break
+            pos = base + n
+            now = time.monotonic()
+            if progress and now - last_report >= PROGRESS_INTERVAL:
+                progress(pos - start, end - start, now - started)
+                last_report = now
+    finally:
+        os.close(fd)
+    return dirty_map.first if dirty_map is not None else None
+
+
+# - Statistical sampling -
+def sample_count(confidence, tolerance):
+    """Blocks to sample so that, if at least `tolerance` of all blocks are
+    dirty, one of them is hit with probability `confidence`:
+    n = ceil(ln(1 - c) / ln(1 - p))"""
+    return math.ceil(math.log(1 - confidence) / math.log(1 - tolerance))
+
+
+def achieved_confidence(samples, tolerance):
+    return 1 - (1 - tolerance) ** samples
+
+
+class SamplePlan:
+    """Stratified sample of block offsets, reproducible from the seed"""
+
+    def __init__(self, size, block_size, confidence, tolerance, seed=None):
+        self.size = size
+        self.block_size = block_size
+        self.confidence = confidence
+        self.tolerance = tolerance
+        self.seed = seed if seed is not None else int.from_bytes(os.urandom(8), "little")
+        blocks = max(1, size // block_size)
+        self.strata = min(blocks, sample_count(confidence, tolerance))
+        rng = random.Random(self.seed)
+        # One block drawn uniformly from each of `strata` equal slices of the
+        # device, so offsets come out sorted; first and last block always checked
+        picks = {0, blocks - 1}
+        for i in range(self.strata):
+            lo = i * blocks // self.strata
+            hi = max(lo + 1, (i + 1) * blocks // self.strata)
+            picks.add(rng.randrange(lo, hi))
+        self.offsets = [b * block_size for b in sorted(picks)]
+        self.checked = 0
+        self.read_mode = None
+
+    def as_dict(self):
+        return {
+            "seed": self.seed,
+            "confidence_target": self.confidence,
+            "tolerance": self.tolerance,
+            "block_size": self.block_size,
+            "strata": self.strata,
+            "samples": len(self.offsets),
+            "samples_checked": self.checked,
+            "read_mode": self.read_mode,
+            # the fixed first/last blocks are not random draws
+            "confidence_achieved": round(achieved_confidence(min(self.checked, self.strata),
+                                                             self.tolerance), 6),
+        }
+
+
+def sampled_scan_zero(device, plan, zero_check="memcmp", cancel_flag=None, direct=True,
+                      pattern=None, dirty_map=None):
+    """Read plan.offsets in ascending order, coalescing runs of adjacent blocks
+    into one preadv of up to SAMPLE_BATCH buffers. Returns the first
+    mismatching sample offset or None; plan.checked counts the blocks actually
+    checked."""
+    check = block_checker(pattern, zero_check)
+    bs = plan.block_size
+    batch = memoryview(aligned_buffer(bs * SAMPLE_BATCH))
+    bufs = [batch[i * bs:(i + 1) * bs] for i in range(SAMPLE_BATCH)]
+    fd, plan.read_mode, _ = open_verify(device, direct)
+    try:
+        offsets = plan.offsets
+        i = 0
+        while i < len(offsets):
+            if cancel_flag is not None and cancel_flag.is_set():
+                raise Cancelled()
+            j = i + 1
+            while j < len(offsets) and j - i < SAMPLE_BATCH and offsets[j] == offsets[j - 1] + bs:
+                j += 1
+            got = os.preadv(fd, bufs[:j - i], offsets[i])
+            for k in range(j - i):
+                n = min(bs, max(0, got - k * bs))
+                if not check(bufs[k][:n], offsets[i + k]):
+                    if dirty_map is None:
+                        plan.checked += k + 1
+                        return offsets[i + k]
+                    record_mismatch(dirty_map, bufs[k][:n], offsets[i + k], check)
+                    if dirty_map.full:
+                        plan.checked += k + 1
+                        return dirty_map.first
+            plan.checked += j - i
+            i = j
+    finally:
+        os.close(fd)
+    return dirty_map.first if dirty_map is not None else None
@@ -0,0 +1,738 @@
+import os
+import ctypes
+import errno
+import mmap
+import queue
+import threading
+import time
+from datetime import datetime
+
+from blockdev import (device_size, logical_block_size, is_block_device, offload_caps,
+                      range_ioctl)
+from patterns import make_pattern, restore_pattern, ZeroPattern
+
+DEFAULT_CHUNK = 4 * 1024 * 1024
+PROGRESS_INTERVAL = 1.0  # seconds between progress callbacks
+
+# Generation/write pipeline defaults
+PIPELINE_BUFFERS = 4      # aligned buffers in the ring
+PIPELINE_QUEUE_DEPTH = 2  # filled buffers allowed to wait for the writer
+PIPELINE_GENERATORS = 1   # pattern generator threads
+STRIPE_ALIGN = 1024 * 1024  # stripe boundaries for striped writers
+AIO_QUEUE_DEPTH = 32        # I/Os in flight for the Linux AIO backend
+CHECKPOINT_EVERY = 4 * 1024**3  # bytes between durable checkpoints when journaling
+OFFLOAD_RANGE = 1024**3         # bytes per BLKZEROOUT/BLKDISCARD call (progress granularity)
+WRITEBACK_WINDOW = 64 * 1024**2  # buffered mode: dirty bytes per writer before writeback is started
+
+# <linux/fs.h> sync_file_range flags
+SYNC_FILE_RANGE_WAIT_BEFORE = 1
+SYNC_FILE_RANGE_WRITE = 2
+SYNC_FILE_RANGE_WAIT_AFTER = 4
+
+
+class Cancelled(Exception):
+    pass
+
+
+# - Buffers / file handles -
+def aligned_buffer(size):
+    """Anonymous mmap: page aligned and zero filled, as O_DIRECT requires"""
+    return mmap.mmap(-1, size)
+
+
+def open_target(device, write=True, direct=True):
+    """Open device with O_DIRECT when possible. Returns (fd, direct_used)"""
+    flags = os.O_WRONLY if write else os.O_RDONLY
+    if direct and hasattr(os, "O_DIRECT"):
+        try:
+            return os.open(device, flags | os.O_DIRECT), True
+        except OSError as e:
+            if e.errno != errno.EINVAL:
+                raise
+    return os.open(device, flags), False
+
+
+class BufferPool:
+    """Aligned buffers kept for the life of a multi-pass run, so each pass
+    reuses the same memory instead of mapping fresh buffers"""
+
+    def __init__(self, block_size):
+        self.block_size = block_size
+        self.buffers = []
+
+    def take(self, count):
+        while len(self.buffers) < count:
+            self.buffers.append(aligned_buffer(self.block_size))
+        return self.buffers[:count]
+
+
+def round_down(value, align):
+    return value - (value % align)
+
+
+def pwrite_all(fd, view, offset):
+    """pwrite until the whole view is written (handles short writes)"""
+    done = 0
+    while done < len(view):
+        n = os.pwrite(fd, view[done:], offset + done)
+        if n <= 0:
+            raise OSError(errno.EIO, f"short write at offset {offset + done}")
+        done += n
+    return done
+
+
+# - Bounded writeback (buffered mode) -
+_libc = None
+
+
+def sync_file_range(fd, offset, nbytes, flags):
+    """sync_file_range(2) through libc; falls back to fdatasync where missing"""
+    global _libc
+    if _libc is None:
+        try:
+            _libc = ctypes.CDLL(None, use_errno=True)
+            _libc.sync_file_range.argtypes = [ctypes.c_int, ctypes.c_int64, ctypes.c_int64,
+                                              ctypes.c_uint]
+        except (OSError, AttributeError):
+            _libc = False
+    if _libc and _libc.sync_file_range(fd, offset, nbytes, flags) == 0:
+        return
+    if _libc:
+        err = ctypes.get_errno()
+        if err not in (errno.ENOSYS, errno.ESPIPE, errno.EINVAL):
+            raise OSError(err, f"sync_file_range: {os.strerror(err)}")
+    if flags & SYNC_FILE_RANGE_WAIT_AFTER:
+        os.fdatasync(fd)
+
+
+class Writeback:
+    """Keeps the page cache dirtied by one sequential writer bounded to about
+    two windows: once a window is written, writeback is started on it, the
+    previous window is waited for and its pages are dropped with
+    POSIX_FADV_DONTNEED. Without this a buffered pass piles up gigabytes of
+    dirty cache and the final fsync stalls the host."""
+
+    def __init__(self, fd, window=WRITEBACK_WINDOW):
+        self.fd = fd
+        self.window = window
+        self.start = None  # window currently being dirtied
+        self.end = None
+        self.prev = None   # (offset, length) submitted for writeback, not yet waited on
+
+    def wrote(self, offset, n):
+        # Several generators can complete slightly out of order; only a real
+        # jump (e.g. a new segment) closes the window early
+        if self.start is None or offset + n < self.start or offset > self.end + self.window:
+            self.flush()
+            self.start, self.end = offset, offset + n
+        else:
+            self.start = min(self.start, offset)
+            self.end = max(self.end, offset + n)
+        if self.end - self.start >= self.window:
+            self._submit()
+
+    def _submit(self):
+        off, n = self.start, self.end - self.start
+        sync_file_range(self.fd, off, n, SYNC_FILE_RANGE_WRITE)
+        self._release()
+        self.prev = (off, n)
+        self.start = self.end
+
+    def _release(self):
+        if self.prev:
+            off, n = self.prev
+            sync_file_range(self.fd, off, n, SYNC_FILE_RANGE_WAIT_BEFORE | SYNC_FILE_RANGE_WRITE
+                            | SYNC_FILE_RANGE_WAIT_AFTER)
+            os.posix_fadvise(self.fd, off, n, os.POSIX_FADV_DONTNEED)
+            self.prev = None
+
+    def flush(self):
+        """Write back and drop everything this writer still has dirty"""
+        if self.start is not None and self.end > self.start:
+            self._submit()
+        self._release()
+
+
+# - Generation/write pipeline -
+class PipelineStats:
+    """Where a pipelined pass spent its waiting time.
+    gen_stall: writer idle, waiting for a filled buffer (CPU/RNG bound)
+    io_stall:  generators idle, waiting for a free buffer (device bound)"""
+
+    def __init__(self, buffers, queue_depth, generators):
+        self.buffers = buffers
+        self.queue_depth = queue_depth
+        self.generators = generators
+        self.gen_stall = 0.0
+        self.io_stall = 0.0
+        self.bytes = 0
+        self.elapsed = 0.0
+        self._lock = threading.Lock()
+
+    def add_io_stall(self, seconds):
+        with self._lock:
+            self.io_stall += seconds
+
+    def merge(self, other):
+        """Fold in a later segment of the same pass (journal checkpoints split passes)"""
+        self.gen_stall += other.gen_stall
+        self.io_stall += other.io_stall
+        self.bytes += other.bytes
+        self.elapsed += other.elapsed
+        return self
+
+    def bound(self):
+        # io_stall is summed over generator threads
+        io = self.io_stall / max(1, self.generators)
+        if max(io, self.gen_stall) < 0.05 * self.elapsed:
+            return "balanced"
+        return "io" if io > self.gen_stall else "generation"
+
+    def summary(self):
+        rate = self.bytes / self.elapsed / (1024**2) if self.elapsed > 0 else 0
+        return (f"pipeline: {self.buffers} buffers, queue depth {self.queue_depth}, "
+                f"{self.generators} generator(s), {rate:.1f} MiB/s; stalled on generation "
+                f"{self.gen_stall:.1f}s, stalled on I/O {self.io_stall:.1f}s ({self.bound()}-bound)")
+
+
+def _put(q, item, stop):
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def _get(q, stop):
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            pass
+    return None
+
+
+def pipelined_write(fd, start, end, pattern, block_size=DEFAULT_CHUNK,
+                    buffers=PIPELINE_BUFFERS, queue_depth=PIPELINE_QUEUE_DEPTH,
+                    generators=PIPELINE_GENERATORS, cancel_flag=None, progress=None,
+                    pool=None, writeback_window=None, readback=None):
+    """Write pattern over [start, end) of fd. Generator threads fill a ring of
+    aligned buffers (taken from pool when given) while the calling thread
+    drains them with pwrite, so pattern generation and device I/O overlap.
+    writeback_window bounds dirty page cache for buffered fds (see Writeback);
+    readback.wrote(offset, n) is told about every completed write.
+    Returns PipelineStats; raises Cancelled or the first generator/write error."""
+    generators = max(1, generators)
+    buffers = max(buffers, generators + 1)
+    queue_depth = max(1, min(queue_depth, buffers))
+    stats = PipelineStats(buffers, queue_depth, generators)
+    free_q = queue.Queue()
+    filled_q = queue.Queue(maxsize=queue_depth)
+    for buf in (pool or BufferPool(block_size)).take(buffers):
+        free_q.put(buf)
+
+    stop = threading.Event()
+    errors = []
+    claim_lock = threading.Lock()
+    cursor = [start]
+
+    def generate():
+        try:
+            while not stop.is_set():
+                t = time.monotonic()
+                buf = _get(free_q, stop)
+                if buf is None:
+                    break
+                with claim_lock:
+                    off = cursor[0]
+                    n = min(block_size, end - off)
+                    cursor[0] = off + max(n, 0)
+                if n <= 0:
+                    free_q.put(buf)
+                    break
+                stats.add_io_stall(time.monotonic() - t)
+                pattern.fill(memoryview(buf)[:n], off)
+                t = time.monotonic()
+                if not _put(filled_q, (off, n, buf), stop):
+                    break
+                stats.add_io_stall(time.monotonic() - t)
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+
+    workers = [threading.Thread(target=generate, daemon=True) for _ in range(generators)]
+    for w in workers:
+        w.start()
+
+    writeback = Writeback(fd, writeback_window) if writeback_window else None
+    total = end - start
+    started = last_report = time.monotonic()
+    try:
+        while stats.bytes < total:
+            if cancel_flag is not None and cancel_flag.is_set():
+                raise Cancelled()
+            t = time.monotonic()
+            item = _get(filled_q, stop)
+            stats.gen_stall += time.monotonic() - t
+            if item is None:
+                break
+            off, n, buf = item
+            pwrite_all(fd, memoryview(buf)[:n], off)
+            free_q.put(buf)
+            if writeback:
+                writeback.wrote(off, n)
+            if readback:
+                readback.wrote(off, n)
+            stats.bytes += n
+            now = time.monotonic()
+            if progress and now - last_report >= PROGRESS_INTERVAL:
+                progress(stats.bytes, total, now - started)
+                last_report = now
+        if writeback:
+            writeback.flush()
+    finally:
+        stop.set()
+        for w in workers:
+            w.join()
+        stats.elapsed = time.monotonic() - started
+    if errors:
+        raise errors[0]
+    return stats
+
+
+# - Striped writers -
+class Stripe:
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
+        self.done = 0
+
+    def __len__(self):
+        return self.end - self.start
+
+
+class StripeProgress:
+    """Per-stripe byte counters for a striped pass"""
+
+    def __init__(self, stripes):
+        self.stripes = stripes
+        self.elapsed = 0.0
+
+    def done(self):
+        return sum(s.done for s in self.stripes)
+
+    def merge(self, other):
+        """Fold in a later segment: stripe #i accumulates every segment's #i"""
+        merged = []
+        for i in range(max(len(self.stripes), len(other.stripes))):
+            parts = [s[i] for s in (self.stripes, other.stripes) if i < len(s)]
+            stripe = Stripe(0, sum(len(p) for p in parts))
+            stripe.done = sum(p.done for p in parts)
+            merged.append(stripe)
+        self.stripes = merged
+        self.elapsed += other.elapsed
+        return self
+
+    def summary(self):
+        total = sum(len(s) for s in self.stripes)
+        rate = self.done() / self.elapsed / (1024**2) if self.elapsed > 0 else 0
+        parts = ", ".join(f"#{i} {100 * s.done // max(1, len(s))}%" for i, s in enumerate(self.stripes))
+        return (f"striped: {len(self.stripes)} stripes over {total} bytes, "
+                f"{rate:.1f} MiB/s; {parts}")
+
+
+def split_stripes(start, end, count, align):
+    """Cut [start, end) into at most count stripes whose bounds are multiples of align"""
+    count = max(1, count)
+    per = -(-(end - start) // count)
+    per = max(align, -(-per // align) * align)
+    stripes = []
+    pos = start
+    while pos < end:
+        stripes.append(Stripe(pos, min(end, pos + per)))
+        pos += per
+    return stripes
+
+
+def striped_write(fd, start, end, pattern, block_size=DEFAULT_CHUNK, threads=4,
+                  cancel_flag=None, progress=None, pool=None, writeback_window=None,
+                  readback=None):
+    """Write pattern over [start, end) with one worker thread per stripe, each
+    doing positional writes from its own aligned buffer. Keeps `threads` I/Os
+    in flight for devices that need queue depth. With writeback_window each
+    stripe bounds its own dirty cache (see Writeback); readback.wrote() is
+    called from the stripe threads. Returns StripeProgress."""
+    tracker = StripeProgress(split_stripes(start, end, threads, STRIPE_ALIGN))
+    bufs = (pool or BufferPool(block_size)).take(len(tracker.stripes))
+    stop = threading.Event()
+    finished = threading.Event()
+    errors = []
+    remaining = [len(tracker.stripes)]
+    lock = threading.Lock()
+
+    def work(stripe, buf):
+        try:
+            view = memoryview(buf)
+            writeback = Writeback(fd, writeback_window) if writeback_window else None
+            pos = stripe.start + stripe.done
+            while pos < stripe.end and not stop.is_set():
+                n = min(block_size, stripe.end - pos)
+                pattern.fill(view[:n], pos)
+                pwrite_all(fd, view[:n], pos)
+                if writeback:
+                    writeback.wrote(pos, n)
+                if readback:
+                    readback.wrote(pos, n)
+                pos += n
+                stripe.done += n
+            if writeback and not stop.is_set():
+                writeback.flush()
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            with lock:
+                remaining[0] -= 1
+                if remaining[0] == 0:
+                    finished.set()
+
+    workers = [threading.Thread(target=work, args=(s, b), daemon=True)
+               for s, b in zip(tracker.stripes, bufs)]
+    if not workers:
+        finished.set()
+    for w in workers:
+        w.start()
+    total = end - start
+    started = last_report = time.monotonic()
+    try:
+        while not finished.wait(0.1):
+            if cancel_flag is not None and cancel_flag.is_set():
+                raise Cancelled()
+            now = time.monotonic()
+            if progress and now - last_report >= PROGRESS_INTERVAL:
+                progress(tracker.done(), total, now - started)
+                last_report = now
+    finally:
+        stop.set()
+        for w in workers:
+            w.join()
+        tracker.elapsed = time.monotonic() - started
+    if errors:
+        raise errors[0]
+    return tracker
+
+
+# - Overwrite engine -
+def multipass_overwrite(device, schedule, block_size=DEFAULT_CHUNK, logf=None,
+                        cancel_flag=None, progress=None, buffers=PIPELINE_BUFFERS,
+                        queue_depth=PIPELINE_QUEUE_DEPTH, generators=PIPELINE_GENERATORS,
+                        threads=1, io_backend="threads", aio_depth=AIO_QUEUE_DEPTH,
+                        journal=None, checkpoint_every=CHECKPOINT_EVERY, io_mode="direct",
+                        writeback_window=WRITEBACK_WINDOW, readback=None):
+    """Walk the whole target once per entry of schedule ('random', 'zero',
+    '0x55', ... or pattern objects; random entries get a fresh seed per pass)
+    with one open file, one set of aligned buffers and one flush per pass.
+
+    Writes go through the generation/write pipeline, `threads` striped writers
+    when threads > 1, or Linux AIO when io_backend is 'aio' (falls back to the
+    thread path if the kernel refuses). progress(done, total, elapsed, label)
+    is called with byte counts of the current pass.
+
+    With a journal, passes it records as done are skipped, the current pass
+    resumes at its checkpoint (with the keystream seed the journal holds for
+    it), and each checkpoint_every bytes are flushed with fdatasync before
+    journal.checkpoint(pass, offset).
+
+    io_mode 'buffered' goes through the page cache instead of O_DIRECT; dirty
+    memory is then held to about two writeback_window's per writer thread.
+
+    readback (verify.InlineVerifier) re-reads the final pass as it is written:
+    readback.start(pattern) before that pass, wrote(offset, n) per write and
+    finish() after its flush. Returns (success, status)."""
+    fd = None
+    try:
+        fd, direct = open_target(device, direct=(io_mode != "buffered"))
+        size = device_size(device, fd)
+        lbs = logical_block_size(device, fd)
+        block_size = max(lbs, round_down(block_size, lbs))
+        if io_backend == "aio" and not direct:
+            if logf: logf.write("Linux AIO needs O_DIRECT, using thread-pool writers.\n")
+            io_backend = "threads"
+        if io_backend == "aio":
+            from linux_aio import aio_available
+            if not aio_available():
+                if logf: logf.write("Linux AIO unavailable, using thread-pool writers.\n")
+                io_backend = "threads"
+        engine = f"aio depth {aio_depth}" if io_backend == "aio" else f"writers {threads}"
+        if logf:
+            logf.write(f"[{datetime.now().isoformat()}] In-process overwrite on {device}: "
+                       f"{len(schedule)} pass(es) {[getattr(p, 'name', p) for p in schedule]}, "
+                       f"{size} bytes, block {block_size}, "
+                       f"logical block {lbs}, {engine}, O_DIRECT={'on' if direct else 'off'}\n")
+        pool = BufferPool(block_size)
+        for i, spec in enumerate(schedule):
+            start = journal.start_for(i) if journal else 0
+            if start is None:
+                if logf: logf.write(f"Pass {i+1}/{len(schedule)} ({spec}) already complete, skipping.\n")
+                continue
+            pattern = make_pattern(spec)
+            if journal:
+                # A resumed pass must continue the same keystream, so the
+                # seed of every pass lives in the journal
+                saved = journal.pattern_state(i)
+                if saved:
+                    pattern = restore_pattern(saved)
+                else:
+                    journal.set_pattern(i, pattern.state())
+            label = f"Pass {i+1}/{len(schedule)} {pattern.describe()['pattern']}"
+            start = min(round_down(start, lbs), round_down(size, lbs))
+            if journal:
+                journal.begin_pass(i, start)
+            if logf:
+                logf.write(f"{label}{f', resuming at {start}' if start else ''}\n")
+            check = readback if i == len(schedule) - 1 else None
+            if check:
+                check.start(pattern)
+            fd, direct = _overwrite_pass(fd, direct, device, size, lbs, i, pattern, label, start,
+                                         block_size, pool, buffers, queue_depth, generators,
+                                         threads, io_backend, aio_depth, journal,
+                                         checkpoint_every, writeback_window, check, logf,
+                                         cancel_flag, progress)
+            if check:
+                check.finish()
+            if journal:
+                journal.end_pass(i)
+        return True, "multipass_ok"
+    except Cancelled:
+        if logf: logf.write("Overwrite cancelled.\n")
+        return False, "cancelled_by_user"
+    except PermissionError:
+        if logf: logf.write("Permission denied. Run as root!\n")
+        return False, "multipass_failed"
+    except Exception as e:
+        if logf: logf.write(f"In-process overwrite error: {e}\n")
+        return False, "multipass_failed"
+    finally:
+        if readback:
+            readback.close()
+        if fd is not None:
+            os.close(fd)
+
+
+def _overwrite_pass(fd, direct, device, size, lbs, index, pattern, label, start, block_size,
+                    pool, buffers, queue_depth, generators, threads, io_backend, aio_depth,
+                    journal, checkpoint_every, writeback_window, readback, logf, cancel_flag,
+                    progress):
+    """One full pass of multipass_overwrite. Returns the (possibly reopened) fd"""
+    # O_DIRECT needs block multiples; any sub-block tail is written buffered below
+    body = round_down(size, lbs) if direct else size
+    step = max(lbs, round_down(checkpoint_every, lbs)) if journal else max(1, body - start)
+    started = time.monotonic()
+    pos = start
+    stats = None
+    while pos < body:
+        end = min(body, pos + step)
+        seg_progress = None
+        if progress:
+            seg_progress = lambda done, total, elapsed, base=pos: \
+                progress(base + done, size, time.monotonic() - started, label)
+        writeback = None if direct else writeback_window
+        try:
+            if io_backend == "aio" and direct:
+                from linux_aio import aio_write
+                seg = aio_write(fd, pos, end, pattern, block_size, aio_depth, cancel_flag,
+                                seg_progress, pool, readback)
+            elif threads > 1:
+                seg = striped_write(fd, pos, end, pattern, block_size, threads, cancel_flag,
+                                    seg_progress, pool, writeback, readback)
+            else:
+                seg = pipelined_write(fd, pos, end, pattern, block_size, buffers, queue_depth,
+                                      generators, cancel_flag, seg_progress, pool, writeback,
+                                      readback)
+        except OSError as e:
+            if not (direct and e.errno == errno.EINVAL and pos == start):
+                raise
+            # Filesystem accepted O_DIRECT on open but rejects the writes
+            if logf: logf.write("O_DIRECT rejected by target, using buffered writes.\n")
+            os.close(fd)
+            fd, direct = open_target(device, direct=False)
+            body = size
+            continue
+        stats = seg if stats is None else stats.merge(seg)  # one summary per pass
+        pos = end
+        if journal:
+            os.fdatasync(fd)
+            journal.checkpoint(index, pos)
+    if stats and logf: logf.write(stats.summary() + "\n")
+
+    if body < size:
+        tail = pool.take(1)[0]
+        view = memoryview(tail)[:size - body]
+        pattern.fill(view, body)
+        tfd = os.open(device, os.O_WRONLY)
+        try:
+            pwrite_all(tfd, view, body)
+            os.fsync(tfd)
+        finally:
+            os.close(tfd)
+        if readback:
+            readback.wrote(body, size - body)
+
+    os.fsync(fd)  # the single flush of this pass
+    if journal:
+        journal.checkpoint(index, size)
+    if progress:
+        progress(size, size, time.monotonic() - started, label)
+    if logf: logf.write(f"{label} complete: {size - start} bytes.\n")
+    return fd, direct
+
+
+def rewrite_ranges(device, ranges, pattern, block_size=DEFAULT_CHUNK, logf=None,
+                   cancel_flag=None):
+    """Rewrite just the given [start, end) ranges with pattern (seekable, so a
+    keystream range comes out exactly as the full pass wrote it). Ranges are
+    widened to logical blocks for O_DIRECT. Returns (success, status, bytes)."""
+    fd = None
+    written = 0
+    try:
+        fd, direct = open_target(device)
+        size = device_size(device, fd)
+        lbs = logical_block_size(device, fd)
+        block_size = max(lbs, round_down(block_size, lbs))
+        pool = BufferPool(block_size)
+        for start, end in ranges:
+            if cancel_flag is not None and cancel_flag.is_set():
+                raise Cancelled()
+            start = round_down(start, lbs)
+            end = min(size, -(-end // lbs) * lbs)
+            body = round_down(end, lbs) if direct else end
+            if body > start:
+                pipelined_write(fd, start, body, pattern, block_size, cancel_flag=cancel_flag,
+                                pool=pool)
+            if end > body:
+                # sub-block tail of an odd-sized image
+                view = memoryview(pool.take(1)[0])[:end - body]
+                pattern.fill(view, body)
+                tfd = os.open(device, os.O_WRONLY)
+                try:
+                    pwrite_all(tfd, view, body)
+                    os.fsync(tfd)
+                finally:
+                    os.close(tfd)
+            written += end - start
+        os.fsync(fd)
+        if logf: logf.write(f"Rewrote {len(ranges)} range(s), {written} bytes.\n")
+        return True, "rewrite_ok", written
+    except Cancelled:
+        if logf: logf.write("Range rewrite cancelled.\n")
+        return False, "cancelled_by_user", written
+    except Exception as e:
+        if logf: logf.write(f"Range rewrite error: {e}\n")
+        return False, "rewrite_failed", written
+    finally:
+        if fd is not None:
+            os.close(fd)
+
+
+def direct_overwrite(device, pattern="zero", logf=None, **opts):
+    """Single-pass multipass_overwrite. pattern is 'zero', 'random' or a
+    patterns.* object. Returns (success, status) like the other wipe routines."""
+    pattern = make_pattern(pattern)
+    kind = pattern.describe()["pattern"]
+    ok, status = multipass_overwrite(device, [pattern], logf=logf, **opts)
+    if status == "cancelled_by_user":
+        return ok, status
+    return ok, f"direct_{kind}_{'ok' if ok else 'failed'}"
+
+
+# - Kernel offload (Clear) -
+def offload_zero(device, logf=None, cancel_flag=None, progress=None, discard=None,
+                 journal=None, checkpoint_every=CHECKPOINT_EVERY, block_size=DEFAULT_CHUNK,
+                 **_stream_opts):
+    """Clear the device to zeros in OFFLOAD_RANGE steps with BLKZEROOUT, letting
+    the kernel/device do the work. discard='discard' or 'secdiscard' first
+    deallocates each range (where allowed) before it is zeroed. Ranges the kernel
+    rejects are streamed with the userspace zero writer instead.
+    Returns (success, status, report) where report records the bytes per tier,
+    the tier that zeroed most of the device and the discard tier, if any ran."""
+    report = {"caps": offload_caps(device), "bytes": {}, "rejected": [], "tier": None,
+              "discard": None}
+    fd = None
+    try:
+        if not is_block_device(device):
+            raise OSError(errno.ENOTBLK, "kernel offload needs a block device")
+        fd, direct = open_target(device)
+        size = device_size(device, fd)
+        lbs = logical_block_size(device, fd)
+        tiers = ["zeroout"]
+        if report["caps"]["write_zeroes_max_bytes"] == 0 and logf:
+            logf.write("Device has no write-zeroes support; kernel will emulate BLKZEROOUT.\n")
+        if discard and report["caps"]["discard_max_bytes"]:
+            tiers.insert(0, discard)
+        if logf:
+            logf.write(f"[{datetime.now().isoformat()}] Offload clear on {device}: {size} bytes, "
+                       f"tiers {tiers}, caps {report['caps']}\n")
+        start = journal.start_for(0) if journal else 0
+        if start is None:
+            # done before an interruption (e.g. during verify): do not zero it again
+            if logf: logf.write("Offload clear already complete, skipping.\n")
+            report.update(journal.state.get("offload") or {})
+            return True, "zero_offload_ok", report
+        start = min(round_down(start, lbs), size)
+        if journal:
+            journal.begin_pass(0, start)
+        pool = BufferPool(block_size)
+        zero = ZeroPattern()
+        started = time.monotonic()
+        last_flush = pos = start
+        while pos < size:
+            if cancel_flag is not None and cancel_flag.is_set():
+                raise Cancelled()
+            n = min(OFFLOAD_RANGE, size - pos)
+            zeroed = False
+            for tier in list(tiers):
+                try:
+                    range_ioctl(fd, tier, pos, n)
+                except OSError as e:
+                    if e.errno in (errno.EOPNOTSUPP, errno.ENOTTY, errno.ENOSYS):
+                        tiers.remove(tier)  # not supported at all: stop trying it
+                    report["rejected"].append({"tier": tier, "offset": pos, "length": n,
+                                               "error": os.strerror(e.errno)})
+                    continue
+                report["bytes"][tier] = report["bytes"].get(tier, 0) + n
+                zeroed = zeroed or tier == "zeroout"
+            if not zeroed:
+                pipelined_write(fd, pos, pos + n, zero, block_size, cancel_flag=cancel_flag, pool=pool)
+                report["bytes"]["stream"] = report["bytes"].get("stream", 0) + n
+            pos += n
+            if journal and (pos - last_flush >= checkpoint_every or pos == size):
+                os.fdatasync(fd)
+                journal.checkpoint(0, pos)
+                last_flush = pos
+            if progress:
+                progress(pos, size, time.monotonic() - started, "zero offload")
+        os.fsync(fd)
+        # the clear tier is whatever zeroed the data; a discard only deallocates
+        # ahead of it and is reported on its own
+        cleared = {t: n for t, n in report["bytes"].items() if t in ("zeroout", "stream")}
+        report["tier"] = max(cleared, key=cleared.get) if cleared else None
+        report["discard"] = discard if report["bytes"].get(discard) else None
+        if journal:
+            journal.state["offload"] = {k: report[k] for k in ("bytes", "tier", "discard")}
+            journal.end_pass(0)
+        if logf:
+            rejected = len(report["rejected"])
+            logf.write(f"Offload clear complete: {report['bytes']}"
+                       + (f", {rejected} rejected range(s)" if rejected else "") + "\n")
+        return True, "zero_offload_ok", report
+    except Cancelled:
+        if logf: logf.write("Offload clear cancelled.\n")
+        return False, "cancelled_by_user", report
+    except Exception as e:
+        if logf: logf.write(f"Offload clear error: {e}\n")
+        return False, "zero_offload_failed", report
+    finally:
+        if fd is not None:
+            os.close(fd)